@@ -0,0 +1,119 @@
+from typing import Callable, Tuple
+import numpy as np
+import logging
+import os
+import time
+
+from vector_math import normalize_rows, take_rows, top_k
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+ANN_ENABLED = os.getenv('ANN_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Below this many vectors exact search is fast enough and always used
+ANN_MIN_SIZE = int(os.getenv('ANN_MIN_SIZE', '20000'))
+# Number of clusters; 0 picks 4 * sqrt(n)
+ANN_NLIST = int(os.getenv('ANN_NLIST', '0'))
+# Clusters scanned per query: higher means better recall and slower queries
+ANN_NPROBE = int(os.getenv('ANN_NPROBE', '8'))
+# nprobe is raised at build time until the sampled recall@k reaches this value
+ANN_TARGET_RECALL = float(os.getenv('ANN_TARGET_RECALL', '0.95'))
+
+logger = logging.getLogger(__name__)
+
+
+class IVFIndex:
+    """Inverted-file index: k-means clusters over unit vectors, scanning only the nearest clusters.
+
+    Vectors are stored reordered by cluster so every inverted list is one
+    contiguous slice of ``self.vectors``. A QuantizedMatrix input stays
+    quantized in the lists. A caller that adopts ``self.vectors`` as its own
+    copy calls ``detach_rows`` so results become positions in that copy.
+    """
+
+    def __init__(self, matrix: np.ndarray, nlist: int = ANN_NLIST, nprobe: int = ANN_NPROBE,
+                 iterations: int = 10, seed: int = 42):
+        start = time.perf_counter()
+        n = matrix.shape[0]
+        self.nlist = min(n, nlist or max(1, int(4 * np.sqrt(n))))
+        self.nprobe = max(1, min(nprobe, self.nlist))
+        self.centroids = self._train(matrix, iterations, np.random.default_rng(seed))
+
+        assignment = self._assign(matrix)
+        self.rows = np.argsort(assignment, kind='stable')
+        self.vectors = take_rows(matrix, self.rows)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=self.nlist))))
+        logger.info(f"Built IVF index over {n} vectors with {self.nlist} lists in {time.perf_counter() - start:.2f}s")
+
+    def _train(self, matrix, iterations, rng):
+        """Spherical k-means on a sample of the vectors"""
+        n = matrix.shape[0]
+        sample = matrix[rng.choice(n, size=min(n, self.nlist * 40), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=self.nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = (sample @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=self.nlist) == 0
+            if empty.any():
+                # Re-seed empty clusters with random sample points
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def _assign(self, matrix, batch_size: int = 8192):
+        return np.concatenate([
+            (matrix[i:i + batch_size] @ self.centroids.T).argmax(axis=1)
+            for i in range(0, matrix.shape[0], batch_size)
+        ]) if matrix.shape[0] else np.empty(0, dtype=np.int64)
+
+    def detach_rows(self) -> np.ndarray:
+        """Hand over the cluster order (position in ``vectors`` -> input row); search then returns positions"""
+        rows, self.rows = self.rows, None
+        return rows
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Approximate top-k row indices (into the original matrix, or ``vectors`` once detached) and scores"""
+        probes, _ = top_k(self.centroids, query, nprobe or self.nprobe)
+        candidates = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probes])
+        best, scores = top_k(self.vectors[candidates], query, k)
+        positions = candidates[best]
+        return (positions if self.rows is None else self.rows[positions]), scores
+
+
+def recall_at_k(matrix: np.ndarray, search: Callable, queries: np.ndarray, k: int = 4) -> float:
+    """Mean fraction of the exact top-k that ``search(query, k)`` also returns"""
+    hits = 0
+    for query in queries:
+        exact, _ = top_k(matrix, query, k)
+        approx, _ = search(query, k)
+        hits += len(set(exact.tolist()) & set(approx.tolist()))
+    return hits / (len(queries) * min(k, matrix.shape[0])) if len(queries) else 1.0
+
+
+def sample_queries(matrix: np.ndarray, count: int = 50, seed: int = 7) -> np.ndarray:
+    """Synthetic queries between pairs of stored vectors, for recall checks"""
+    rng = np.random.default_rng(seed)
+    n = matrix.shape[0]
+    pairs = rng.integers(0, n, size=(count, 2))
+    return normalize_rows(matrix[pairs[:, 0]] + matrix[pairs[:, 1]])
+
+
+def build_ann_index(matrix: np.ndarray, k: int = 4):
+    """Build an IVF index when the matrix is large enough, tuning nprobe to the recall target.
+
+    Returns None when exact search should be used instead.
+    """
+    if not ANN_ENABLED or matrix.shape[0] < ANN_MIN_SIZE:
+        return None
+    index = IVFIndex(matrix)
+    queries = sample_queries(matrix)
+    while True:
+        recall = recall_at_k(matrix, index.search, queries, k)
+        if recall >= ANN_TARGET_RECALL or index.nprobe >= index.nlist:
+            break
+        index.nprobe = min(index.nlist, index.nprobe * 2)
+    logger.info(f"IVF recall@{k} against brute force: {recall:.3f} with nprobe={index.nprobe}/{index.nlist}")
+    return index
@@ -0,0 +1,414 @@
+"""Retrieval scaling benchmark for the RAG engine.
+
+Builds synthetic corpora of increasing size (web-article prose and
+repository sources), runs them through the same stages as
+RAGPipeline (scan, split, embed, index) and reports per-stage time and peak
+memory, query latency percentiles and recall of approximate search (ANN, quantized vectors) against
+exact search. Embeddings are deterministic feature hashes by default, so runs
+are offline and comparable across commits.
+
+Corpora are JSONL document streams like ./data/results.jsonl by default,
+chunked with iter_jsonl_chunks as in production; ``--format txt`` writes
+plain text files (prose and gitingest-style dumps) chunked with
+iter_file_chunks instead.
+
+    python benchmark.py --sizes 1000,10000,100000
+    python benchmark.py --sizes 10000 --format txt
+    ANN_MIN_SIZE=5000 python benchmark.py --sizes 10000 --model sentence-transformers/all-MiniLM-L6-v2
+"""
+from langchain_core.embeddings import Embeddings
+from typing import List
+import argparse
+import json
+import os
+import re
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+import numpy as np
+
+from chunking import CHUNK_OVERLAP, CHUNK_SIZE, get_text_splitter, iter_file_chunks, iter_jsonl_chunks, scan_text_file
+from embedding_executor import BatchedEmbeddings
+from vector_index import LocalVectorIndex
+from keyword_index import BM25Index, HybridIndex
+import ann_index
+
+# Characters per synthetic data file; larger corpora are spread over several sources
+FILE_CHARS = 4_000_000
+
+_WORD = re.compile(r'[a-z0-9_]+')
+
+PROSE_WORDS = (
+    "the model data training retrieval index vector query search latency memory throughput "
+    "embedding pipeline document context answer language system performance cache network "
+    "research results method approach evaluation benchmark dataset accuracy recall precision "
+    "transformer attention layer token batch inference server client request response user"
+).split()
+CODE_WORDS = (
+    "def class return import self config path value result items args kwargs logger error "
+    "client request response handler parse load save build search index vector cache token"
+).split()
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic offline embeddings: signed feature hashing of lower-cased words"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.buckets = {}
+
+    def _bucket(self, word: str):
+        bucket = self.buckets.get(word)
+        if bucket is None:
+            h = zlib.crc32(word.encode('utf-8'))
+            bucket = self.buckets[word] = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+        return bucket
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in _WORD.findall(text.lower()):
+            index, sign = self._bucket(word)
+            vector[index] += sign
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def _sentence(rng, words, topic_words, length):
+    # Each file leans on its own topic words so sources are distinguishable
+    pool = words + topic_words * 3
+    return " ".join(pool[i] for i in rng.integers(0, len(pool), size=length)).capitalize() + "."
+
+
+def _identifier(rng, topic_words):
+    return "_".join(rng.choice(CODE_WORDS + topic_words, size=2))
+
+
+def prose_text(rng, chars: int, topic_words: List[str]) -> str:
+    """Web-article style text: headings and paragraphs"""
+    parts, size = [], 0
+    while size < chars:
+        if rng.random() < 0.1:
+            block = "## " + _sentence(rng, PROSE_WORDS, topic_words, 4)
+        else:
+            block = " ".join(_sentence(rng, PROSE_WORDS, topic_words, int(rng.integers(8, 25))) for _ in range(int(rng.integers(3, 8))))
+        parts.append(block)
+        size += len(block) + 2
+    return "\n\n".join(parts)
+
+
+def code_text(rng, chars: int, topic_words: List[str]) -> str:
+    """Python-looking source with functions, docstrings and comments"""
+    lines, size = [], 0
+    while size < chars:
+        name = _identifier(rng, topic_words)
+        body = [f"def {name}(self, {_identifier(rng, topic_words)}):",
+                f'    """{_sentence(rng, PROSE_WORDS, topic_words, 8)}"""']
+        for _ in range(int(rng.integers(3, 12))):
+            if rng.random() < 0.2:
+                body.append(f"    # {_sentence(rng, PROSE_WORDS, topic_words, 6)}")
+            else:
+                body.append(f"    {_identifier(rng, topic_words)} = self.{_identifier(rng, topic_words)}({_identifier(rng, topic_words)})")
+        body.append(f"    return {_identifier(rng, topic_words)}")
+        block = "\n".join(body)
+        lines.append(block)
+        size += len(block) + 2
+    return "\n\n".join(lines)
+
+
+def gitingest_text(rng, chars: int, topic_words: List[str]) -> str:
+    """Repository dump in the layout written by gitingest: summary, tree, then one block per file"""
+    repo = _identifier(rng, topic_words)
+    files = [f"src/{_identifier(rng, topic_words)}.py" for _ in range(max(1, chars // 20000))] + ["README.md"]
+    header = (
+        f"Repository: example/{repo}\nFiles analyzed: {len(files)}\n\n"
+        "Directory structure:\n" + f"└── {repo}/\n" + "\n".join(f"    ├── {path}" for path in files) + "\n\n"
+    )
+    blocks, per_file = [header], max(1000, chars // len(files))
+    for path in files:
+        content = prose_text(rng, per_file, topic_words) if path.endswith(".md") else code_text(rng, per_file, topic_words)
+        blocks.append(f"{'=' * 48}\nFILE: {path}\n{'=' * 48}\n{content}\n")
+    return "\n".join(blocks)
+
+
+def web_documents(rng, chars: int, topic_words: List[str], index: int) -> List[dict]:
+    """Scraped pages in the results.jsonl layout, a few thousand to a few tens of thousands of characters each"""
+    documents, size = [], 0
+    while size < chars:
+        text = prose_text(rng, min(int(rng.integers(3000, 30000)), chars - size), topic_words)
+        url = f"https://example.com/{index}/{len(documents)}"
+        documents.append({"text": text, "source": url, "title": _sentence(rng, PROSE_WORDS, topic_words, 5),
+                          "type": "url", "metadata": {"sourceURL": url}})
+        size += len(text)
+    return documents
+
+
+def repository_documents(rng, chars: int, topic_words: List[str]) -> List[dict]:
+    """Repository in the layout written by repo_ingest: an overview, then one document per file"""
+    name = f"example/{_identifier(rng, topic_words)}"
+    files = ["README.md"] + [f"src/{_identifier(rng, topic_words)}.py" for _ in range(max(1, chars // 20000))]
+    overview = f"Repository: {name}\nCommit: {'0' * 40}\nFiles included: {len(files)}\n\nDirectory structure:\n" + "\n".join(files)
+    documents = [{"text": overview, "source": f"https://github.com/{name}", "title": name, "type": "github_repo",
+                  "metadata": {"repo": name, "commit": "0" * 40}}]
+    per_file = max(1000, chars // len(files))
+    for path in files:
+        text = prose_text(rng, per_file, topic_words) if path.endswith(".md") else code_text(rng, per_file, topic_words)
+        documents.append({"text": text, "source": f"https://github.com/{name}/blob/{'0' * 40}/{path}",
+                          "title": f"{name}/{path}", "type": "github_repo",
+                          "metadata": {"repo": name, "commit": "0" * 40, "path": path}})
+    return documents
+
+
+def write_corpus(directory: str, n_chunks: int, seed: int = 42, corpus_format: str = "jsonl") -> List[str]:
+    """Write roughly n_chunks worth of text as alternating prose and repository files.
+
+    ``jsonl`` files hold one document per line like ./data/results.jsonl
+    (pages, or a repository's overview and files); ``txt`` files are plain
+    prose or gitingest-style dumps.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    total_chars = n_chunks * (CHUNK_SIZE - CHUNK_OVERLAP)
+    paths = []
+    for i in range(max(1, -(-total_chars // FILE_CHARS))):
+        chars = min(FILE_CHARS, total_chars - i * FILE_CHARS)
+        topic_words = [f"topic{i}_{j}" for j in range(5)] + list(rng.choice(PROSE_WORDS, size=5))
+        if corpus_format == "jsonl":
+            documents = repository_documents(rng, chars, topic_words) if i % 2 else web_documents(rng, chars, topic_words, i)
+            path = os.path.join(directory, f"{'repo' if i % 2 else 'web'}_{i}.jsonl")
+            with open(path, 'w', encoding='utf-8') as file:
+                for document in documents:
+                    file.write(json.dumps(document, ensure_ascii=False) + "\n")
+        else:
+            make = gitingest_text if i % 2 else prose_text
+            path = os.path.join(directory, f"{make.__name__.split('_')[0]}_{i}.txt")
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(make(rng, chars, topic_words))
+        paths.append(path)
+    return paths
+
+
+class Stage:
+    """Times a block and records its peak traced memory"""
+
+    def __init__(self, report: dict, name: str, trace_memory: bool):
+        self.report = report
+        self.name = name
+        self.trace_memory = trace_memory
+
+    def __enter__(self):
+        if self.trace_memory:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.report[f"{self.name}_s"] = round(time.perf_counter() - self.start, 3)
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.report[f"{self.name}_peak_mb"] = round(peak / 2**20, 1)
+        return False
+
+
+def percentiles(samples: List[float]) -> dict:
+    values = np.asarray(samples) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(values, p)), 3) for p in (50, 90, 99)}
+
+
+def sample_query_texts(documents, count: int, seed: int = 7) -> List[tuple]:
+    """(query text, section) pairs made of a short span of a random chunk"""
+    rng = np.random.default_rng(seed)
+    queries = []
+    for row in rng.integers(0, len(documents), size=count):
+        doc = documents[row]
+        words = doc.page_content.split()
+        start = int(rng.integers(0, max(1, len(words) - 12)))
+        queries.append((" ".join(words[start:start + 12]), doc.metadata["section"]))
+    return queries
+
+
+def run_precision(index_dir: str, precision: str, queries, query_vectors, k: int, trace_memory: bool) -> dict:
+    """Rebuild the engine with quantized vectors and compare it with exact float32 search"""
+    report = {}
+    index = LocalVectorIndex(index_dir, precision=precision)
+    with Stage(report, "build", trace_memory):
+        index.similarity_search_by_vector(query_vectors[0], k=k)
+    engine = index.engine
+    latencies, hits = [], 0
+    for (_, section), vector in zip(queries, query_vectors):
+        start = time.perf_counter()
+        results = engine.search(vector, k=k, filter={"section": section})
+        latencies.append(time.perf_counter() - start)
+        exact_ids = {doc.metadata["chunk_id"] for doc, _ in engine.search(vector, k=k, filter={"section": section}, exact=True)}
+        hits += len(exact_ids & {doc.metadata["chunk_id"] for doc, _ in results})
+    report["query"] = percentiles(latencies)
+    report[f"recall@{k}"] = round(hits / max(1, len(queries) * k), 4)
+    report["vector_mb"] = engine.stats["vector_mb"]
+    return report
+
+
+def run_size(n_chunks: int, workdir: str, embeddings: Embeddings, n_queries: int, k: int, trace_memory: bool,
+             precisions: List[str] = (), corpus_format: str = "jsonl") -> dict:
+    """Benchmark one corpus size and return its report"""
+    report = {"target_chunks": n_chunks, "format": corpus_format}
+    data_dir = os.path.join(workdir, f"data_{n_chunks}")
+    index_dir = os.path.join(workdir, f"index_{n_chunks}")
+    paths = write_corpus(data_dir, n_chunks, corpus_format=corpus_format)
+    report["files"] = len(paths)
+
+    with Stage(report, "load", trace_memory):
+        scanned = [(path, *scan_text_file(path)) for path in paths]
+    report["chars"] = sum(chars for _, _, chars in scanned)
+
+    # Same per-format chunkers as RAGPipeline.load_documents
+    with Stage(report, "split", trace_memory):
+        text_splitter = get_text_splitter()
+        chunks = {
+            path: list(iter_jsonl_chunks(path, text_splitter=text_splitter) if path.endswith('.jsonl')
+                       else iter_file_chunks(path, chars, text_splitter=text_splitter))
+            for path, _, chars in scanned
+        }
+    report["chunks"] = sum(len(docs) for docs in chunks.values())
+
+    with Stage(report, "embed", trace_memory):
+        vectors = {path: embeddings.embed_documents([doc.page_content for doc in docs]) for path, docs in chunks.items()}
+    report["embed_chunks_per_s"] = round(report["chunks"] / max(report["embed_s"], 1e-9), 1)
+
+    index = HybridIndex(LocalVectorIndex(index_dir), BM25Index(os.path.join(index_dir, 'bm25')))
+    with Stage(report, "index_write", trace_memory):
+        for path, fingerprint, _ in scanned:
+            index.add_documents(path, fingerprint, chunks[path], vectors[path])
+    del vectors
+
+    # The first search loads the segments and builds the in-memory engine (and any ANN index)
+    index = HybridIndex(LocalVectorIndex(index_dir), BM25Index(os.path.join(index_dir, 'bm25')))
+    probe = embeddings.embed_query("benchmark warm up query")
+    with Stage(report, "index_build", trace_memory):
+        index.search("benchmark warm up query", probe, k=k)
+    engine = index.vector_index.engine
+    report["ann_partitions"] = sorted(value for value, (_, _, ann) in engine.partitions.items() if ann is not None)
+
+    queries = sample_query_texts(engine.documents, n_queries)
+    query_vectors = [embeddings.embed_query(text) for text, _ in queries]
+    dense, exact, hybrid, hits = [], [], [], 0
+    for (text, section), vector in zip(queries, query_vectors):
+        start = time.perf_counter()
+        approx_results = engine.search(vector, k=k, filter={"section": section})
+        dense.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        exact_results = engine.search(vector, k=k, filter={"section": section}, exact=True)
+        exact.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        index.search(text, vector, k=k, filter={"section": section})
+        hybrid.append(time.perf_counter() - start)
+
+        exact_ids = {doc.metadata["chunk_id"] for doc, _ in exact_results}
+        hits += len(exact_ids & {doc.metadata["chunk_id"] for doc, _ in approx_results})
+    report["query_dense"] = percentiles(dense)
+    report["query_exact"] = percentiles(exact)
+    report["query_hybrid"] = percentiles(hybrid)
+    report[f"recall@{k}"] = round(hits / max(1, len(queries) * k), 4)
+    report["vector_mb"] = engine.stats["vector_mb"]
+
+    report["quantized"] = {
+        precision: run_precision(index_dir, precision, queries, query_vectors, k, trace_memory)
+        for precision in precisions if precision != "float32"
+    }
+    return report
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: dict):
+    print(f"\n== {report['chunks']} chunks ({report['files']} {report['format']} files, {report['chars'] / 1e6:.1f}M chars) ==")
+    for stage in ("load", "split", "embed", "index_write", "index_build"):
+        peak = report.get(f"{stage}_peak_mb")
+        print(f"  {stage:<12} {report[f'{stage}_s']:>9.3f}s" + (f"  peak {peak:>8.1f} MB" if peak is not None else ""))
+    for mode in ("query_dense", "query_exact", "query_hybrid"):
+        latency = report[mode]
+        print(f"  {mode:<12} p50 {latency['p50_ms']:.3f}ms  p90 {latency['p90_ms']:.3f}ms  p99 {latency['p99_ms']:.3f}ms")
+    recall_key = next(key for key in report if key.startswith("recall@"))
+    print(f"  {recall_key:<12} {report[recall_key]}  (ANN on: {report['ann_partitions'] or 'none'})")
+    print(f"  vectors      {report['vector_mb']:>9.1f} MB in memory (float32)")
+    for precision, quantized in report["quantized"].items():
+        latency = quantized["query"]
+        print(
+            f"  {precision:<12} {quantized['vector_mb']:>9.1f} MB  {recall_key} {quantized[recall_key]}  "
+            f"p50 {latency['p50_ms']:.3f}ms  p99 {latency['p99_ms']:.3f}ms  build {quantized['build_s']:.3f}s"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark RAG retrieval on synthetic corpora")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated corpus sizes in chunks")
+    parser.add_argument("--queries", type=int, default=200, help="Queries timed per corpus")
+    parser.add_argument("--k", type=int, default=4, help="Results per query")
+    parser.add_argument("--dim", type=int, default=384, help="Dimension of the hashed embeddings")
+    parser.add_argument("--model", default=None, help="Use this local embedding model instead of hashed embeddings")
+    parser.add_argument("--workdir", default=None, help="Keep corpora and indexes here instead of a temporary directory")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc; timings are then free of its overhead")
+    parser.add_argument("--precisions", default="float16,int8",
+                        help="Quantized precisions compared with float32 (memory, latency, recall after rescoring)")
+    parser.add_argument("--format", choices=("jsonl", "txt"), default="jsonl",
+                        help="Corpus file format: JSONL documents as ingested by knowledge_base, or plain text files")
+    parser.add_argument("--output", default="./output/benchmark.json", help="Where to write the JSON report")
+    args = parser.parse_args()
+
+    if args.model:
+        from model_registry import get_embeddings
+        base = get_embeddings(args.model)
+    else:
+        base = HashEmbeddings(args.dim)
+    embeddings = BatchedEmbeddings(base, workers=0)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="devecho-bench-")
+    results = {
+        "revision": git_revision(),
+        "embeddings": args.model or f"hash-{args.dim}",
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "format": args.format,
+        "ann": {"enabled": ann_index.ANN_ENABLED, "min_size": ann_index.ANN_MIN_SIZE,
+                "nprobe": ann_index.ANN_NPROBE, "target_recall": ann_index.ANN_TARGET_RECALL},
+        "sizes": [],
+    }
+    try:
+        for size in (int(value) for value in args.sizes.split(",")):
+            report = run_size(size, workdir, embeddings, args.queries, args.k, not args.no_memory,
+                              [value for value in args.precisions.split(",") if value], args.format)
+            print_report(report)
+            results["sizes"].append(report)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    # ru_maxrss is KiB on Linux
+    results["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=4)
+    print(f"\nMax RSS {results['max_rss_mb']} MB, report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import Iterator, List, Tuple
+import hashlib
+import json
+import logging
+import os
+
+from storage import source_id
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '1000'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '200'))
+# Characters read from disk at a time when streaming a file into chunks
+STREAM_BLOCK_CHARS = int(os.getenv('STREAM_BLOCK_CHARS', '65536'))
+
+SECTIONS = ("beginning", "middle", "end")
+# Offset gap between consecutive documents of a JSONL file, so their chunks are never merged as neighbours
+DOCUMENT_GAP = 2
+
+logger = logging.getLogger(__name__)
+
+
+def section_for(offset: int, total: int) -> str:
+    """Section of a chunk starting at a character offset: first, second or last third of the source"""
+    position = 3 * offset / max(1, total)
+    if position < 1:
+        return "beginning"
+    elif position < 2:
+        return "middle"
+    return "end"
+
+
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        add_start_index=True
+    )
+
+
+def split_document(doc: Document, text_splitter: RecursiveCharacterTextSplitter = None) -> List[Document]:
+    """Split one source document and tag every chunk with its section and a stable chunk id"""
+    text_splitter = text_splitter or get_text_splitter()
+    source = doc.metadata.get("source", "default")
+    splits = text_splitter.split_documents([doc])
+    prefix = source_id(source)
+    for i, split in enumerate(splits):
+        split.metadata["source"] = source
+        split.metadata["section"] = section_for(split.metadata.get("start_index", 0), len(doc.page_content))
+        split.metadata["chunk_id"] = f"{prefix}:{i}"
+    return splits
+
+
+def iter_text_blocks(path: str, block_chars: int = STREAM_BLOCK_CHARS) -> Iterator[str]:
+    """Read a UTF-8 text file a block at a time"""
+    with open(path, 'r', encoding='utf-8') as file:
+        while True:
+            block = file.read(block_chars)
+            if not block:
+                return
+            yield block
+
+
+def scan_text_file(path: str) -> Tuple[str, int]:
+    """Content hash and character count of a text file, read in blocks"""
+    digest = hashlib.sha256()
+    total_chars = 0
+    for block in iter_text_blocks(path):
+        digest.update(block.encode('utf-8'))
+        total_chars += len(block)
+    return digest.hexdigest(), total_chars
+
+
+def _carry_point(buffer: str, splits: List[Document], ready: int, force: bool) -> Tuple[int, int]:
+    """(chunks to emit, offset the carried tail starts at) for a buffer whose first ``ready`` chunks are final.
+
+    The tail may only start at a chunk that opens with a paragraph shorter
+    than a chunk, right after a lone "\n\n": the splitter then separates and
+    merges what follows exactly as it does in the whole text. Without one,
+    nothing is emitted and the whole buffer is carried, unless ``force``,
+    which cuts at the first chunk that is not final.
+    """
+    for count in range(min(ready, len(splits) - 1), 0, -1):
+        start = splits[count].metadata["start_index"]
+        paragraph = start - 2
+        if paragraph > 0 and buffer[paragraph:start] == "\n\n" and buffer[paragraph - 1] != "\n":
+            end = buffer.find("\n\n", start)
+            if end != -1 and end - paragraph < CHUNK_SIZE:
+                return count, paragraph
+    if force:
+        return ready, splits[ready].metadata["start_index"] if ready < len(splits) else len(buffer)
+    return 0, 0
+
+
+def iter_file_chunks(path: str, total_chars: int, source: str = None,
+                     text_splitter: RecursiveCharacterTextSplitter = None,
+                     block_chars: int = STREAM_BLOCK_CHARS) -> Iterator[Document]:
+    """Yield the chunks of a text file lazily, holding only about one block in memory.
+
+    Each block is split together with the unfinished tail of the previous
+    one. Chunks that end within one chunk length of the buffer end may still
+    change when more text arrives, so they are carried over and re-split.
+    The carried tail starts at a paragraph break, which the splitter treats
+    the same whether or not the text before it is present, so the chunks
+    match splitting the whole file at once. Text with no such break is cut
+    at a chunk start once the carry outgrows a few blocks.
+    """
+    text_splitter = text_splitter or get_text_splitter()
+    source = source or path
+    prefix = source_id(source)
+    block_chars = max(block_chars, 4 * CHUNK_SIZE)
+
+    carry, carry_offset, index = "", 0, 0
+    blocks = iter_text_blocks(path, block_chars)
+    block = next(blocks, None)
+    while block is not None:
+        next_block = next(blocks, None)
+        buffer = carry + block
+        splits = text_splitter.create_documents([buffer])
+
+        if next_block is None:
+            ready, cut = splits, len(buffer)
+        else:
+            safe_end = len(buffer) - CHUNK_SIZE
+            ready = [s for s in splits if s.metadata["start_index"] + len(s.page_content) <= safe_end]
+            count, cut = _carry_point(buffer, splits, len(ready), force=len(buffer) > 4 * block_chars)
+            ready = splits[:count]
+
+        for split in ready:
+            start_index = carry_offset + split.metadata["start_index"]
+            yield Document(page_content=split.page_content, metadata={
+                "source": source,
+                "start_index": start_index,
+                "section": section_for(start_index, total_chars),
+                "chunk_id": f"{prefix}:{index}"
+            })
+            index += 1
+
+        carry, carry_offset = buffer[cut:], carry_offset + cut
+        block = next_block
+
+
+def iter_jsonl_documents(path: str) -> Iterator[dict]:
+    """Documents of a JSONL ingestion file, one per line; lines without text are skipped"""
+    with open(path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Skipping malformed line {line_number} of {path}: {str(e)}")
+                continue
+            if isinstance(record, dict) and isinstance(record.get("text"), str) and record["text"].strip():
+                yield record
+
+
+def iter_jsonl_chunks(path: str, source: str = None,
+                      text_splitter: RecursiveCharacterTextSplitter = None) -> Iterator[Document]:
+    """Yield the chunks of a JSONL document stream, holding one document at a time.
+
+    Each line is ``{"text", "source", "title", "type", "metadata"}``. Chunks
+    carry the document's URL, title and type plus its scalar metadata.
+    Offsets and sections run over the whole file as one corpus, with a gap
+    between documents.
+    """
+    text_splitter = text_splitter or get_text_splitter()
+    source = source or path
+    prefix = source_id(source)
+    total_chars = sum(len(record["text"]) + DOCUMENT_GAP for record in iter_jsonl_documents(path))
+
+    offset, index = 0, 0
+    for record in iter_jsonl_documents(path):
+        metadata = {
+            key: value for key, value in (record.get("metadata") or {}).items()
+            if isinstance(value, (str, int, float, bool))
+        }
+        metadata.update(url=record.get("source") or "", title=record.get("title") or "", type=record.get("type") or "")
+        for split in text_splitter.create_documents([record["text"]]):
+            start_index = offset + split.metadata["start_index"]
+            yield Document(page_content=split.page_content, metadata={
+                **metadata,
+                "source": source,
+                "start_index": start_index,
+                "section": section_for(start_index, total_chars),
+                "chunk_id": f"{prefix}:{index}"
+            })
+            index += 1
+        offset += len(record["text"]) + DOCUMENT_GAP
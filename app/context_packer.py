@@ -0,0 +1,97 @@
+from langchain_core.documents import Document
+from typing import List
+import logging
+import math
+import os
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+# Prompt tokens available for retrieved context in generate
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '3000'))
+# Rough characters per token for English text and code; avoids a tokenizer dependency
+CHARS_PER_TOKEN = float(os.getenv('CHARS_PER_TOKEN', '4'))
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class _Span:
+    """Contiguous text of one source built from one or more chunks"""
+
+    def __init__(self, rank: int, doc: Document):
+        self.rank = rank
+        self.source = doc.metadata.get("source")
+        self.start = doc.metadata.get("start_index")
+        self.text = doc.page_content
+        self.metadata = dict(doc.metadata)
+        self.chunk_ids = [doc.metadata.get("chunk_id")]
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+    def touches(self, other: "_Span") -> bool:
+        return (
+            self.start is not None and other.start is not None and self.source == other.source
+            and self.start <= other.end and other.start <= self.end
+        )
+
+    def absorb(self, other: "_Span"):
+        """Merge an overlapping or adjacent span, keeping each character once"""
+        if other.start < self.start:
+            self.text = other.text[:self.start - other.start] + self.text
+            self.start = other.start
+            self.metadata.update(start_index=other.start, section=other.metadata.get("section"))
+        if other.end > self.end:
+            self.text = self.text + other.text[self.end - other.start:]
+        self.rank = min(self.rank, other.rank)
+        self.chunk_ids.extend(other.chunk_ids)
+
+
+def pack_context(docs: List[Document], token_budget: int = CONTEXT_TOKEN_BUDGET) -> List[Document]:
+    """Merge overlapping chunks of the same source and fill the token budget in relevance order.
+
+    ``docs`` must be ordered best first. Neighbouring chunks share up to
+    ``chunk_overlap`` characters, so merging them removes the repeated text.
+    Chunks without a start offset are only de-duplicated by exact text.
+    """
+    spans: List[_Span] = []
+    seen_texts = set()
+    for rank, doc in enumerate(docs):
+        if doc.page_content in seen_texts:
+            continue
+        seen_texts.add(doc.page_content)
+        span = _Span(rank, doc)
+        # A new chunk can bridge two spans, so keep merging until nothing touches
+        merged = True
+        while merged:
+            merged = False
+            for existing in spans:
+                if existing.touches(span):
+                    existing.absorb(span)
+                    spans.remove(existing)
+                    span = existing
+                    merged = True
+                    break
+        spans.append(span)
+
+    packed, used = [], 0
+    for span in sorted(spans, key=lambda s: s.rank):
+        remaining = token_budget - used
+        if remaining <= 0:
+            break
+        text = span.text
+        if estimate_tokens(text) > remaining:
+            text = text[:int(remaining * CHARS_PER_TOKEN)]
+        used += estimate_tokens(text)
+        packed.append(Document(page_content=text, metadata={**span.metadata, "chunk_ids": span.chunk_ids}))
+
+    before = sum(estimate_tokens(doc.page_content) for doc in docs)
+    logger.info(f"Packed {len(docs)} chunks into {len(packed)} passages, ~{before} -> ~{used} tokens")
+    return packed
@@ -0,0 +1,75 @@
+from typing import Dict, Iterable, List, NamedTuple
+import logging
+import os
+
+from chunking import scan_text_file
+from storage import read_json, write_json
+from vector_index import VECTOR_INDEX_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class FileChange(NamedTuple):
+    path: str
+    fingerprint: str
+    total_chars: int
+
+
+class ManifestDiff(NamedTuple):
+    changed: List[FileChange]
+    unchanged: List[str]
+    deleted: List[str]
+
+
+class DataManifest:
+    """Fingerprints (size, mtime, content hash) of the files that are in the index.
+
+    A file whose size and mtime match its entry is treated as unchanged
+    without being read; otherwise it is re-hashed, and only a different hash
+    marks it for re-indexing.
+    """
+
+    def __init__(self, path: str = os.path.join(VECTOR_INDEX_DIR, 'data_manifest.json')):
+        self.path = path
+        self.entries: Dict[str, dict] = read_json(self.path, {})
+
+    def diff(self, paths: Iterable[str], indexed_sources: Dict[str, str]) -> ManifestDiff:
+        """Compare files on disk with the manifest and with what the index actually holds"""
+        paths = list(paths)
+        changed, unchanged = [], []
+        for path in paths:
+            stat = os.stat(path)
+            entry = self.entries.get(path)
+            in_index = entry is not None and indexed_sources.get(path) == entry["sha256"]
+
+            if in_index and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                unchanged.append(path)
+                continue
+
+            fingerprint, total_chars = scan_text_file(path)
+            if in_index and entry["sha256"] == fingerprint:
+                # Touched but not modified
+                self.record(path, fingerprint, total_chars)
+                unchanged.append(path)
+            else:
+                changed.append(FileChange(path, fingerprint, total_chars))
+
+        current = set(paths)
+        deleted = sorted((set(self.entries) | set(indexed_sources)) - current)
+        logger.info(f"Data manifest: {len(changed)} new or modified, {len(unchanged)} unchanged, {len(deleted)} deleted")
+        return ManifestDiff(changed, unchanged, deleted)
+
+    def record(self, path: str, fingerprint: str, total_chars: int):
+        stat = os.stat(path)
+        self.entries[path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": fingerprint,
+            "chars": total_chars
+        }
+
+    def remove(self, path: str):
+        self.entries.pop(path, None)
+
+    def save(self):
+        write_json(self.path, self.entries, indent=4)
@@ -0,0 +1,228 @@
+from langchain_core.embeddings import Embeddings
+from typing import Dict, List, Optional
+import numpy as np
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from storage import write_json
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+EMBEDDING_CACHE_DIR = os.getenv('EMBEDDING_CACHE_DIR', './cache/embeddings')
+EMBEDDING_CACHE_MAX_MB = int(os.getenv('EMBEDDING_CACHE_MAX_MB', '512'))
+# Seconds between index writes while new vectors are being added; callers flush at the end of an ingest
+EMBEDDING_CACHE_FLUSH_SECONDS = float(os.getenv('EMBEDDING_CACHE_FLUSH_SECONDS', '30'))
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(model_name: str, text: str) -> str:
+    """Content address of a chunk embedding"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent, size-capped LRU cache of embeddings for one model.
+
+    Vectors live in a memory-mapped float32 matrix (``vectors.f32``); the key
+    index (``index.json``) maps each content hash to its row and last use.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR, max_mb: int = EMBEDDING_CACHE_MAX_MB):
+        self.model_name = model_name
+        self.max_bytes = max_mb * 1024 * 1024
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.directory = os.path.join(cache_dir, safe_name)
+        self.index_path = os.path.join(self.directory, 'index.json')
+        self.vectors_path = os.path.join(self.directory, 'vectors.f32')
+
+        self.dim = None
+        self.capacity = 0
+        self.entries: Dict[str, list] = {}  # key -> [row, last_used]
+        self.free_rows: List[int] = []
+        self.clock = 0
+        self.matrix = None
+        self.dirty = False
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """Open an existing cache from disk, discarding it if it is unreadable"""
+        if not os.path.exists(self.index_path) or not os.path.exists(self.vectors_path):
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+            dim, capacity = index["dim"], index["capacity"]
+            if capacity != self._capacity_for(dim):
+                logger.info("Embedding cache size limit changed, starting a fresh cache")
+                return
+            self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r+', shape=(capacity, dim))
+            self.dim, self.capacity = dim, capacity
+            self.entries = index["entries"]
+            self.clock = index.get("clock", 0)
+            used = {row for row, _ in self.entries.values()}
+            self.free_rows = [row for row in range(capacity - 1, -1, -1) if row not in used]
+            logger.info(f"Opened embedding cache with {len(self.entries)} vectors ({self.directory})")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable embedding cache: {str(e)}")
+            self.entries, self.free_rows, self.matrix = {}, [], None
+
+    def _capacity_for(self, dim: int) -> int:
+        return max(1, self.max_bytes // (dim * 4))
+
+    def _allocate(self, dim: int):
+        """Create the backing matrix once the embedding dimension is known"""
+        os.makedirs(self.directory, exist_ok=True)
+        self.dim = dim
+        self.capacity = self._capacity_for(dim)
+        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='w+', shape=(self.capacity, dim))
+        self.entries = {}
+        self.free_rows = list(range(self.capacity - 1, -1, -1))
+        logger.info(f"Created embedding cache for {self.capacity} vectors of dim {dim} ({self.directory})")
+
+    def _evict(self, count: int):
+        """Release the least recently used rows"""
+        victims = sorted(self.entries.items(), key=lambda item: item[1][1])[:count]
+        for key, (row, _) in victims:
+            del self.entries[key]
+            self.free_rows.append(row)
+        # The index on disk must stop pointing at these rows before they are overwritten,
+        # or a crash before the next flush would serve another text's vector for an evicted key
+        self._write_index()
+        logger.info(f"Evicted {len(victims)} vectors from the embedding cache")
+
+    def get_many(self, keys: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors by key; missing entries come back as None"""
+        results = []
+        with self.lock:
+            for key in keys:
+                entry = self.entries.get(key)
+                if entry is None:
+                    results.append(None)
+                    continue
+                # Recency is saved with the next flush; a touch alone does not rewrite the index
+                self.clock += 1
+                entry[1] = self.clock
+                results.append(np.array(self.matrix[entry[0]]))
+        return results
+
+    def put_many(self, keys: List[str], vectors: List[List[float]]):
+        """Store vectors, evicting old entries when the cache is full"""
+        if not keys:
+            return
+        with self.lock:
+            if self.matrix is None:
+                self._allocate(len(vectors[0]))
+            new_keys = [key for key in dict.fromkeys(keys) if key not in self.entries]
+            shortfall = len(new_keys) - len(self.free_rows)
+            if shortfall > 0:
+                # Evict a little extra so the next few inserts do not evict again
+                self._evict(min(len(self.entries), shortfall + self.capacity // 10))
+            for key, vector in zip(keys, vectors):
+                if key in self.entries or not self.free_rows:
+                    continue
+                row = self.free_rows.pop()
+                self.matrix[row] = vector
+                self.clock += 1
+                self.entries[key] = [row, self.clock]
+            self.dirty = True
+
+    def flush_if_due(self, interval: float = EMBEDDING_CACHE_FLUSH_SECONDS):
+        """Flush when new vectors are waiting and the last flush is older than ``interval`` seconds"""
+        if self.dirty and time.monotonic() - self.last_flush >= interval:
+            self.flush()
+
+    def flush(self):
+        """Write the vectors and key index to disk"""
+        with self.lock:
+            self.last_flush = time.monotonic()
+            if not self.dirty or self.matrix is None:
+                return
+            self._write_index()
+
+    def _write_index(self):
+        """Flush the vectors, then replace the key index; called with the lock held"""
+        self.matrix.flush()
+        write_json(self.index_path, {
+            "model": self.model_name,
+            "dim": self.dim,
+            "capacity": self.capacity,
+            "clock": self.clock,
+            "entries": self.entries
+        })
+        self.dirty = False
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only computes vectors missing from the cache"""
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(self.cache.model_name, text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text, vector in zip(keys, texts, cached):
+            if vector is None and key not in missing:
+                missing[key] = text
+        if missing:
+            new_vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing.keys()), new_vectors)
+            computed = dict(zip(missing.keys(), new_vectors))
+        else:
+            computed = {}
+        # Rewriting the whole index per call would make a large ingest quadratic in I/O
+        self.cache.flush_if_due()
+
+        logger.info(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} computed")
+        return [
+            vector.tolist() if vector is not None else list(computed[key])
+            for key, vector in zip(keys, cached)
+        ]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def flush(self):
+        self.cache.flush()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str) -> EmbeddingCache:
+    """Return the process-wide cache for a model"""
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name)
+            atexit.register(_caches[model_name].flush)
+        return _caches[model_name]
+
+
+def with_embedding_cache(embeddings: Embeddings) -> Embeddings:
+    """Wrap an embedding model with the on-disk cache when it is enabled"""
+    if not EMBEDDING_CACHE_ENABLED:
+        return embeddings
+    model_name = getattr(embeddings, 'model_name', type(embeddings).__name__)
+    return CachedEmbeddings(embeddings, get_embedding_cache(model_name))
@@ -0,0 +1,279 @@
+from langchain_core.documents import Document
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import logging
+import math
+import os
+import re
+import threading
+
+from storage import SegmentManifest, read_json, write_json
+from vector_index import MMR_FETCH_K, MMR_LAMBDA, VECTOR_INDEX_DIR, VectorIndex, get_vector_index
+from vector_math import mmr, normalize_query
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+HYBRID_SEARCH = os.getenv('HYBRID_SEARCH', 'true').lower() in ('1', 'true', 'yes')
+# Candidates taken from each retriever before fusion
+HYBRID_FETCH_K = int(os.getenv('HYBRID_FETCH_K', '20'))
+# Reciprocal rank fusion damping constant
+RRF_K = int(os.getenv('RRF_K', '60'))
+BM25_K1 = float(os.getenv('BM25_K1', '1.2'))
+BM25_B = float(os.getenv('BM25_B', '0.75'))
+# Query terms found in more than this fraction of chunks are skipped unless every term is that common
+BM25_MAX_DF = float(os.getenv('BM25_MAX_DF', '0.5'))
+
+logger = logging.getLogger(__name__)
+
+_identifier = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+')
+_camel_parts = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased identifiers plus their snake_case and camelCase parts.
+
+    ``process_with_gitingest`` matches both the full name and ``gitingest``.
+    """
+    tokens = []
+    for word in _identifier.findall(text):
+        tokens.append(word.lower())
+        parts = [p for piece in word.split('_') for p in _camel_parts.findall(piece)]
+        if len(parts) > 1:
+            tokens.extend(part.lower() for part in parts)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked id lists; an id scores sum(1 / (k + rank)) over the lists it appears in"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda pair: (-pair[1], pair[0]))
+
+
+class BM25Index:
+    """Inverted index over chunk tokens, persisted per source next to the vector index"""
+
+    def __init__(self, directory: str = os.path.join(VECTOR_INDEX_DIR, 'bm25')):
+        self.directory = directory
+        self.manifest = SegmentManifest(os.path.join(directory, 'sources.json'))
+        self.lock = threading.RLock()
+        self.postings = None  # term -> (rows, term frequencies) as NumPy arrays
+        self.pending = None   # term -> ([rows], [term frequencies]) added since the last pack
+        self.chunk_ids = None  # row -> chunk_id
+        self.lengths = None   # row -> token count
+        self.metadata = None  # row -> metadata used for filtering
+        self.norms = None     # row -> BM25 length normalisation, recomputed on pack
+        self.columns = None   # metadata key -> per-row values, built on first filter by that key
+
+    def _part_path(self, segment: str, part: int) -> str:
+        return os.path.join(self.directory, f"{segment}.{part}.json")
+
+    def _load_postings(self):
+        """Build the in-memory inverted index from every stored part on first use"""
+        if self.postings is not None:
+            return
+        self.postings, self.pending = {}, defaultdict(lambda: ([], []))
+        self.chunk_ids, self.lengths, self.metadata = [], [], []
+        for source, segment, part in self.manifest.parts():
+            chunks = read_json(self._part_path(segment, part))
+            if chunks is None:
+                logger.warning(f"Skipping unreadable keyword segment {part} for {source}")
+                continue
+            for chunk in chunks:
+                self._add_chunk(chunk)
+        self._pack()
+        logger.info(f"Loaded keyword index with {len(self.chunk_ids)} chunks and {len(self.postings)} terms")
+
+    def _add_chunk(self, chunk: dict):
+        row = len(self.chunk_ids)
+        for term, count in chunk["tf"].items():
+            rows, counts = self.pending[term]
+            rows.append(row)
+            counts.append(count)
+        self.chunk_ids.append(chunk["id"])
+        self.lengths.append(chunk["length"])
+        self.metadata.append(chunk["metadata"])
+
+    def _pack(self):
+        """Merge pending postings into the term arrays and recompute the length norms.
+
+        Arrays are replaced rather than grown in place, so a search holding the
+        previous ones is unaffected.
+        """
+        for term, (rows, counts) in self.pending.items():
+            rows, counts = np.array(rows, dtype=np.int32), np.array(counts, dtype=np.float32)
+            if term in self.postings:
+                old_rows, old_counts = self.postings[term]
+                rows, counts = np.concatenate([old_rows, rows]), np.concatenate([old_counts, counts])
+            self.postings[term] = (rows, counts)
+        self.pending.clear()
+        lengths = np.array(self.lengths, dtype=np.float32)
+        avg_length = lengths.mean() if len(lengths) else 1.0
+        self.norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(avg_length, 1e-9))
+        self.columns = {}
+
+    def sources(self) -> Dict[str, str]:
+        with self.lock:
+            return self.manifest.fingerprints()
+
+    def append_documents(self, source: str, documents: List[Document]):
+        """Tokenize a batch of chunks and store their term frequencies"""
+        if not documents:
+            return
+        chunks = []
+        for doc in documents:
+            tokens = tokenize(doc.page_content)
+            chunks.append({
+                "id": doc.metadata["chunk_id"],
+                "tf": dict(Counter(tokens)),
+                "length": len(tokens),
+                "metadata": {key: value for key, value in doc.metadata.items() if isinstance(value, str)}
+            })
+        with self.lock:
+            entry = self.manifest.entry(source)
+            write_json(self._part_path(entry["id"], entry["parts"]), chunks)
+            entry["parts"] += 1
+            self.manifest.save()
+            if self.postings is not None:
+                for chunk in chunks:
+                    self._add_chunk(chunk)
+
+    def set_fingerprint(self, source: str, fingerprint: str):
+        with self.lock:
+            self.manifest.entry(source)["fingerprint"] = fingerprint
+            self.manifest.save()
+
+    def delete_source(self, source: str):
+        with self.lock:
+            entry = self.manifest.pop(source)
+            if entry is None:
+                return
+            for part in range(entry["parts"]):
+                path = self._part_path(entry["id"], part)
+                if os.path.exists(path):
+                    os.remove(path)
+            self.manifest.save()
+            # Rebuild lazily rather than unpicking postings
+            self.postings = None
+
+    def search(self, query: str, k: int = HYBRID_FETCH_K, filter: Optional[dict] = None) -> List[Tuple[str, float]]:
+        """BM25 top-k (chunk_id, score) pairs, optionally restricted by metadata equality"""
+        with self.lock:
+            self._load_postings()
+            if self.pending:
+                self._pack()
+            postings, norms, chunk_ids = self.postings, self.norms, self.chunk_ids
+            columns = [self._column(key) for key in filter] if filter else []
+        n = len(norms)
+        if n == 0:
+            return []
+
+        matches = [postings[term] for term in set(tokenize(query)) if term in postings]
+        common = [len(rows) > BM25_MAX_DF * n for rows, _ in matches]
+        if not all(common):
+            # Very common terms barely move the ranking but cost a pass over most chunks
+            matches = [match for match, is_common in zip(matches, common) if not is_common]
+
+        # Rows are unique within a term's postings, so fancy-index accumulation is safe
+        scores = np.zeros(n, dtype=np.float32)
+        for rows, tfs in matches:
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tfs * (BM25_K1 + 1) / (tfs + norms[rows])
+
+        candidates = np.flatnonzero(scores > 0)
+        for column, value in zip(columns, filter.values() if filter else []):
+            candidates = candidates[column[candidates] == value]
+        if len(candidates) > k > 0:
+            # Keep every chunk tied with the k-th score so ties still break by chunk id
+            cutoff = -np.partition(-scores[candidates], k - 1)[k - 1]
+            candidates = candidates[scores[candidates] >= cutoff]
+        ranked = [(chunk_ids[row], float(scores[row])) for row in candidates]
+        return sorted(ranked, key=lambda pair: (-pair[1], pair[0]))[:k]
+
+    def _column(self, key: str) -> np.ndarray:
+        """Per-row values of one metadata key, for vectorised filtering"""
+        if key not in self.columns:
+            self.columns[key] = np.array([meta.get(key) for meta in self.metadata], dtype=object)
+        return self.columns[key]
+
+
+class HybridIndex(VectorIndex):
+    """Vector index paired with a BM25 keyword index; results are fused with reciprocal rank fusion"""
+
+    def __init__(self, vector_index: VectorIndex, keyword_index: BM25Index):
+        self.vector_index = vector_index
+        self.keyword_index = keyword_index
+
+    def sources(self):
+        # A source counts as indexed only when both indexes hold the same version
+        keyword_sources = self.keyword_index.sources()
+        return {
+            source: fingerprint for source, fingerprint in self.vector_index.sources().items()
+            if keyword_sources.get(source) == fingerprint
+        }
+
+    def append_documents(self, source, documents, vectors):
+        self.vector_index.append_documents(source, documents, vectors)
+        self.keyword_index.append_documents(source, documents)
+
+    def set_fingerprint(self, source, fingerprint):
+        self.vector_index.set_fingerprint(source, fingerprint)
+        self.keyword_index.set_fingerprint(source, fingerprint)
+
+    def delete_source(self, source):
+        self.vector_index.delete_source(source)
+        self.keyword_index.delete_source(source)
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        return self.vector_index.similarity_search_by_vector(embedding, k=k, filter=filter)
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=MMR_FETCH_K, lambda_mult=MMR_LAMBDA, filter=None):
+        return self.vector_index.max_marginal_relevance_search_by_vector(
+            embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter
+        )
+
+    def get_by_ids(self, chunk_ids):
+        return self.vector_index.get_by_ids(chunk_ids)
+
+    def get_vectors(self, chunk_ids):
+        return self.vector_index.get_vectors(chunk_ids)
+
+    def search(self, query, embedding, k=4, filter=None, search_type="similarity", fetch_k=MMR_FETCH_K, lambda_mult=MMR_LAMBDA):
+        dense = self.vector_index.similarity_search_by_vector(embedding, k=HYBRID_FETCH_K, filter=filter)
+        keyword = self.keyword_index.search(query, k=HYBRID_FETCH_K, filter=filter)
+        by_id = {doc.metadata.get("chunk_id"): doc for doc in dense}
+        fused = reciprocal_rank_fusion([list(by_id), [chunk_id for chunk_id, _ in keyword]])
+        fused = fused[:max(k, fetch_k)] if search_type == "mmr" else fused[:k]
+
+        # Keyword-only hits are fetched from the vector store
+        missing = [chunk_id for chunk_id, _ in fused if chunk_id not in by_id]
+        by_id.update((doc.metadata.get("chunk_id"), doc) for doc in self.vector_index.get_by_ids(missing))
+        fused = [(chunk_id, score) for chunk_id, score in fused if chunk_id in by_id]
+        logger.info(f"Hybrid search fused {len(dense)} dense and {len(keyword)} keyword candidates")
+
+        if search_type == "mmr" and fused:
+            # The fused rank is the relevance; embeddings only measure redundancy between candidates
+            scores = np.array([score for _, score in fused], dtype=np.float32)
+            vectors = self.vector_index.get_vectors([chunk_id for chunk_id, _ in fused])
+            order = mmr(vectors, normalize_query(embedding), k, lambda_mult, relevance=scores / scores.max())
+            fused = [fused[i] for i in order]
+        return [by_id[chunk_id] for chunk_id, _ in fused]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> VectorIndex:
+    """Return the process-wide index used by the RAG pipeline"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HybridIndex(get_vector_index(), BM25Index()) if HYBRID_SEARCH else get_vector_index()
+        return _index
@@ -1,238 +1,501 @@
-from langchain_community.tools import TavilySearchResults
-from langchain_community.document_loaders.firecrawl import FireCrawlLoader
-
-from typing import Tuple, Optional, List 
-
-from gitingest import ingest
-import re
-from gitingest import ingest_async
-import asyncio
-import json
-
-from dotenv import load_dotenv
-import os
-
-# Load .env file
-load_dotenv()
-
-# Use os.getenv() to avoid KeyError
-TAVILY_API_KEY = os.getenv('TAVILY_API_KEY')
-FIRECRAWL_API_KEY = os.getenv('FIRECRAWL_API_KEY')
-
-def classify_input(user_instruction: str, user_input: str) -> dict:
-    url_pattern = re.compile(
-        r'^(https?:\/\/)?'                       
-        r'(([a-zA-Z0-9\-_]+\.)+[a-zA-Z]{2,}|'      
-        r'localhost|'                             
-        r'(\d{1,3}\.){3}\d{1,3})'                  
-        r'(:\d+)?(\/[^\s]*)?$'                     
-    )
-
-    user_input = user_input.strip()
-
-    if url_pattern.match(user_input):
-        if "github.com" in user_input:
-            return {
-                "type": "github_repo",
-                "input": user_input,
-                "instruction": user_instruction
-            }
-        else:
-            return {
-                "type": "url",
-                "input": user_input,
-                "instruction": user_instruction
-            }
-    else:
-        return {
-            "type": "topic",
-            "input": user_input,
-            "instruction": user_instruction
-        }
-
-# Modified to be async-compatible
-async def process_with_gitingest_async(github_url: str) -> Tuple[str, str, str]:
-    try:
-        summary, tree, content = await ingest_async(github_url)
-        print(f'Ingested data from {github_url}')
-        return summary, tree, content
-    except Exception as e:
-        print('Ingestion error:', e)
-        return "", "", ""
-
-# Synchronous fallback that doesn't use asyncio.run()
-def process_with_gitingest(github_url: str) -> Tuple[str, str, str]:
-    try:
-        summary, tree, content = ingest(github_url)  # Use synchronous ingest
-        print(f'Ingested data from {github_url}')
-        return summary, tree, content
-    except Exception as e:
-        print('Ingestion error:', e)
-        return "", "", ""
-
-# Modified to support both sync and async operation
-async def handle_github_repo_async(github_url: Optional[str] = None) -> None:
-    if not github_url:
-        print('No url, ingestion Skipped')
-        return
-    summary, tree, content = await process_with_gitingest_async(github_url)
-    try:
-        os.makedirs('./data', exist_ok=True)
-        with open('./data/results.txt', 'w', encoding='utf-8') as file:
-            file.write(summary)
-            file.write(tree)
-            file.write(content)
-            file.close()
-        print('data written')
-    except Exception as e:
-        print('error in writing data')
-        raise
-
-# Keep synchronous version for non-async contexts
-def handle_github_repo(github_url: Optional[str] = None) -> None:
-    if not github_url:
-        print('No url, ingestion Skipped')
-        return
-    summary, tree, content = process_with_gitingest(github_url)
-    try:
-        os.makedirs('./data', exist_ok=True)
-        with open('./data/results.txt', 'w', encoding='utf-8') as file:
-            file.write(summary)
-            file.write(tree)
-            file.write(content)
-            file.close()
-        print('data written')
-    except Exception as e:
-        print('error in writing data')
-        raise
-        
-# Function to handle general URLs
-async def handle_url_async(url):
-    loader = FireCrawlLoader(
-    api_key=FIRECRAWL_API_KEY, url=url, mode="scrape"
-    )
-    pages = []
-    for doc in loader.lazy_load():
-        pages.append(doc)
-    
-    os.makedirs('./data', exist_ok=True)
-    f = open('./data/results.txt', "w", encoding='utf-8')
-    f.write((str(pages)))
-    f.close()
-
-# Synchronous version for backward compatibility
-def handle_url(url):
-    loader = FireCrawlLoader(
-    api_key=FIRECRAWL_API_KEY, url=url, mode="scrape"
-    )
-    pages = []
-    for doc in loader.lazy_load():
-        pages.append(doc)
-    
-    os.makedirs('./data', exist_ok=True)
-    f = open('./data/results.txt', "w", encoding='utf-8')
-    f.write((str(pages)))
-    f.close()
-
-# Async version of handle_topic
-async def handle_topic_async(instruction, query):
-    search = TavilySearchResults(max_results=5, search_depth="advanced", include_answer=True)
-    search_result = search.invoke(instruction + ':-' + query)
-    
-    os.makedirs('./data', exist_ok=True)
-    f = open('./data/results.txt', "w", encoding='utf-8')
-    f.write((str(search_result)))
-    f.close()
-
-# Function to handle topics (synchronous version)
-def handle_topic(instruction, query):
-    search = TavilySearchResults(max_results=5, search_depth="advanced", include_answer=True)
-    search_result = search.invoke(instruction + ':-' + query)
-    
-    os.makedirs('./data', exist_ok=True)
-    f = open('./data/results.txt', "w", encoding='utf-8')
-    f.write((str(search_result)))
-    f.close()
-
-# Async version of process_classification_result
-async def process_classification_result_async(result: dict):
-    input_type = result["type"]
-    input_url = result["input"] if input_type in ["github_repo", "url"] else ""
-
-    if input_type == "github_repo":
-        await handle_github_repo_async(result["input"])
-    elif input_type == "url":
-        await handle_url_async(result["input"])
-    elif input_type == "topic":
-        await handle_topic_async(result["instruction"], result["input"])
-    else:
-        print("Unknown input type.")
-    
-    return result["instruction"], result['input'], input_type, input_url
-
-# Keep synchronous version for backward compatibility
-def process_classification_result(result: dict):
-    input_type = result["type"]
-    input_url = result["input"] if input_type in ["github_repo", "url"] else ""
-
-    if input_type == "github_repo":
-        handle_github_repo(result["input"])
-    elif input_type == "url":
-        handle_url(result["input"])
-    elif input_type == "topic":
-        handle_topic(result["instruction"], result["input"])
-    else:
-        print("Unknown input type.")
-    
-    return result["instruction"], result['input'], input_type, input_url
-
-
-def query_saver(query: str, input_type: str, input_url: str):
-    # Ensure the directory exists
-    os.makedirs('./query', exist_ok=True)
-    with open('./query/query.json', 'w', encoding='utf-8') as file:
-        json.dump({
-            "query": query,
-            "input_type": input_type,
-            "input_url": input_url
-        }, file, indent=4)
-
-# Add async version of run_data_collection
-async def run_data_collection_async(user_inst=None, user_rep=None):
-    # Get user input
-    if user_inst and user_rep:
-        user_instruction = user_inst
-        user_response = user_rep
-    else:
-        user_instruction = input('enter instructions:- ')
-        user_response = input('enter input:-')
-
-    # Classify input
-    result = classify_input(user_instruction, user_response)
-
-    user_prompt, user_input, input_type, input_url = await process_classification_result_async(result)
-    query_saver(user_prompt, input_type, input_url)
-    
-    # Return a message about the data collection
-    return f"Data collected successfully!\nType: {input_type}\nQuery: {user_prompt}"
-  
-def run_data_collection(user_inst=None, user_rep=None):
-    # Get user input
-    if user_inst and user_rep:
-        user_instruction = user_inst
-        user_response = user_rep
-    else:
-        user_instruction = input('enter instructions:- ')
-        user_response = input('enter input:-')
-
-    # Classify input
-    result = classify_input(user_instruction, user_response)
-
-    user_prompt, user_input, input_type, input_url = process_classification_result(result)
-    query_saver(user_prompt, input_type, input_url)
-    
-    # Return a message about the data collection
-    return f"Data collected successfully!\nType: {input_type}\nQuery: {user_prompt}"
-
-if __name__ == '__main__':
+from langchain_community.tools import TavilySearchResults
+from langchain_community.document_loaders.firecrawl import FireCrawlLoader
+
+from typing import Tuple, Optional, List, Union
+from urllib.parse import urlparse
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+
+from ingest_cache import GIT_LS_REMOTE_TIMEOUT, INGEST_CACHE_ENABLED, INGEST_CACHE_TTLS, IngestCache, repo_key, resolve_commit, topic_key, url_key
+from repo_ingest import stream_repository
+
+from dotenv import load_dotenv
+import os
+
+# Load .env file
+load_dotenv()
+
+# Use os.getenv() to avoid KeyError
+TAVILY_API_KEY = os.getenv('TAVILY_API_KEY')
+FIRECRAWL_API_KEY = os.getenv('FIRECRAWL_API_KEY')
+# Seconds a single scrape, search or repository ingest may take before it is abandoned
+INGEST_TIMEOUT = float(os.getenv('INGEST_TIMEOUT', '60'))
+
+# FireCrawl's client is blocking; scrapes run here instead of on the event loop.
+# A timed-out scrape cannot be interrupted, so the pool also caps how many can pile up.
+INGEST_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv('INGEST_WORKERS', '4')), thread_name_prefix='ingest')
+# Local spool and cache file I/O, kept off INGEST_EXECUTOR so scrapes stuck past their
+# timeout can never delay another conversation's cache reads or publishing
+FILE_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv('INGEST_FILE_WORKERS', '4')), thread_name_prefix='ingest-file')
+# Repository ingests (git plus file copies) get their own threads so a slow clone never delays scrapes
+REPO_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv('REPO_INGEST_WORKERS', '2')), thread_name_prefix='repo-ingest')
+# Sources of one request fetched at the same time
+INGEST_CONCURRENCY = int(os.getenv('INGEST_CONCURRENCY', '4'))
+# Fetches at the same time against one host (GitHub, Tavily, a single site)
+INGEST_PER_HOST = int(os.getenv('INGEST_PER_HOST', '2'))
+
+# Ingested documents, one JSON object per line, read directly by RAGPipeline
+RESULTS_PATH = './data/results.jsonl'
+LEGACY_RESULTS_PATH = './data/results.txt'
+# Per-source JSONL files written while fetching, outside ./data so they are never indexed
+SPOOL_DIR = './cache/spool'
+
+# Fetched source documents, reused across requests until its type's TTL expires
+ingest_cache = IngestCache() if INGEST_CACHE_ENABLED else None
+
+URL_PATTERN = re.compile(
+    r'^(https?:\/\/)?'                       
+    r'(([a-zA-Z0-9\-_]+\.)+[a-zA-Z]{2,}|'      
+    r'localhost|'                             
+    r'(\d{1,3}\.){3}\d{1,3})'                  
+    r'(:\d+)?(\/[^\s]*)?$'                     
+)
+
+def is_url(text: str) -> bool:
+    """Whether text is a link rather than a topic.
+
+    Dotted names such as "Node.js" also match URL_PATTERN, so without an
+    explicit http(s):// scheme the text must start with www. or have a path.
+    """
+    match = URL_PATTERN.match(text)
+    return bool(match) and bool(match.group(1) or match.group(6) or text.lower().startswith("www."))
+
+def classify_input(user_instruction: str, user_input: str) -> dict:
+    user_input = user_input.strip()
+
+    if is_url(user_input):
+        if "github.com" in user_input:
+            return {
+                "type": "github_repo",
+                "input": user_input,
+                "instruction": user_instruction
+            }
+        else:
+            return {
+                "type": "url",
+                "input": user_input,
+                "instruction": user_instruction
+            }
+    else:
+        return {
+            "type": "topic",
+            "input": user_input,
+            "instruction": user_instruction
+        }
+
+def new_spool() -> str:
+    """Empty JSONL file that one fetch writes its documents to"""
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=SPOOL_DIR, suffix='.jsonl')
+    os.close(fd)
+    return path
+
+def remove_spool(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def load_cached(key: str, path: str) -> bool:
+    """Copy the cached documents for the key into the spool file; False on a miss or with the cache disabled"""
+    return ingest_cache is not None and ingest_cache.copy_to(key, path)
+
+def store_fetched(key: str, source_type: str, source: str, path: str, ttl: Optional[float] = None) -> None:
+    """Copy a freshly fetched spool file into the ingest cache"""
+    # An empty result is a failed fetch and is tried again next time
+    if ingest_cache is not None and jsonl_stats(path)[1]:
+        ingest_cache.put(key, source_type, source, path, ttl)
+
+def cached(key: str, source_type: str, source: str, fetch, ttl: Optional[float] = None) -> str:
+    """Spool file with the source's documents, copied from the ingest cache or written by fetch(path)"""
+    path = new_spool()
+    try:
+        if not load_cached(key, path):
+            fetch(path)
+            store_fetched(key, source_type, source, path, ttl)
+    except BaseException:
+        remove_spool(path)
+        raise
+    return path
+
+async def acached(key: str, source_type: str, source: str, fetch, ttl: Optional[float] = None) -> str:
+    """Async counterpart of cached; fetch(path) returns an awaitable"""
+    # Cache copies and the size check read whole files, so they run in the file pool
+    loop = asyncio.get_running_loop()
+    path = new_spool()
+    try:
+        if not await loop.run_in_executor(FILE_EXECUTOR, load_cached, key, path):
+            await fetch(path)
+            await loop.run_in_executor(FILE_EXECUTOR, store_fetched, key, source_type, source, path, ttl)
+    except BaseException:
+        remove_spool(path)
+        raise
+    return path
+
+def github_cache_key(github_url: str, deadline: float) -> Tuple[str, Optional[float], Optional[str]]:
+    """Cache key, TTL override and resolved commit of a repository; the key is pinned to the commit"""
+    commit = resolve_commit(github_url, max(0.0, min(GIT_LS_REMOTE_TIMEOUT, deadline - time.monotonic())))
+    # Without a commit a newer push cannot be detected, so keep it no longer than a web page
+    return repo_key(github_url, commit), None if commit else INGEST_CACHE_TTLS["url"], commit
+
+def make_document(text: str, source: str, title: str, source_type: str, metadata: Optional[dict] = None) -> dict:
+    """One line of the JSONL ingestion output"""
+    return {"text": text, "source": source, "title": title, "type": source_type, "metadata": metadata or {}}
+
+def write_jsonl(documents: List[dict], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as file:
+        for document in documents:
+            file.write(json.dumps(document, ensure_ascii=False) + "\n")
+
+def jsonl_stats(path: str) -> Tuple[int, int]:
+    """Number of documents and characters of text in a JSONL file, read a line at a time"""
+    documents, chars = 0, 0
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                documents += 1
+                chars += len(json.loads(line).get("text", "").strip())
+    return documents, chars
+
+def page_documents(url: str, pages: list) -> List[dict]:
+    """Documents of FireCrawl pages: their markdown with URL, title and description"""
+    documents = []
+    for page in pages:
+        metadata = page.metadata or {}
+        documents.append(make_document(
+            page.page_content,
+            metadata.get("sourceURL") or metadata.get("url") or url,
+            metadata.get("title") or metadata.get("ogTitle") or "",
+            "url",
+            {key: metadata[key] for key in ("description", "language") if isinstance(metadata.get(key), str)},
+        ))
+    return documents
+
+def search_documents(query: str, search_result) -> List[dict]:
+    """Documents of Tavily results: each result's content with its URL and title"""
+    # The tool reports API failures as a string instead of raising
+    if isinstance(search_result, str):
+        raise RuntimeError(f"Tavily search for {query!r} failed: {search_result}")
+    documents = []
+    for result in search_result:
+        metadata = {"query": query}
+        if isinstance(result.get("score"), (int, float)):
+            metadata["score"] = result["score"]
+        documents.append(make_document(result.get("content") or "", result.get("url") or "", result.get("title") or "", "topic", metadata))
+    return documents
+
+async def apublish_results(paths: List[str]) -> None:
+    """publish_results on the file pool, so copying the spools does not block the event loop"""
+    await asyncio.get_running_loop().run_in_executor(FILE_EXECUTOR, publish_results, paths)
+
+def publish_sources(paths: List[str], sources: List[dict]) -> None:
+    """Publish the spool files of a multi-source request and its per-source summary"""
+    publish_results(paths)
+    with open('./data/sources.json', 'w', encoding='utf-8') as file:
+        json.dump(sources, file, indent=4)
+
+def publish_results(paths: List[str]) -> None:
+    """Concatenate spool files into the JSONL results read by RAGPipeline, then delete them"""
+    os.makedirs('./data', exist_ok=True)
+    tmp_path = RESULTS_PATH + '.tmp'
+    with open(tmp_path, 'wb') as output:
+        for path in paths:
+            with open(path, 'rb') as spool:
+                shutil.copyfileobj(spool, output)
+    os.replace(tmp_path, RESULTS_PATH)
+    for path in paths:
+        remove_spool(path)
+    # Text dumps of earlier versions would otherwise stay indexed next to the new documents
+    if os.path.exists(LEGACY_RESULTS_PATH):
+        os.remove(LEGACY_RESULTS_PATH)
+
+def fetch_github_repo(github_url: str) -> str:
+    """Spool file of a repository, one document per file, streamed to disk under REPO_MAX_BYTES"""
+    # Commit lookup, git commands and file copies all share one INGEST_TIMEOUT budget
+    deadline = time.monotonic() + INGEST_TIMEOUT
+    key, ttl, commit = github_cache_key(github_url, deadline) if ingest_cache is not None else (None, None, None)
+    # The commit the key was built from is fetched itself, not whatever the ref points to by now
+    return cached(key, "github_repo", github_url,
+                  lambda path: stream_repository(github_url, path, deadline=deadline, commit=commit), ttl)
+
+def discard_spool(future) -> None:
+    """Done callback removing the spool of a fetch whose caller stopped waiting"""
+    if not future.cancelled() and future.exception() is None:
+        remove_spool(future.result())
+
+async def fetch_github_repo_async(github_url: str) -> str:
+    # git runs as blocking subprocesses and files are written as they are read, so the whole
+    # fetch, cache lookup included, runs in the repository pool and only holds one file at a time
+    future = REPO_EXECUTOR.submit(fetch_github_repo, github_url)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), INGEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        # The worker stops at its own deadline; whatever it still writes is deleted
+        future.add_done_callback(discard_spool)
+        raise TimeoutError(f"Ingesting {github_url} took longer than {INGEST_TIMEOUT:.0f}s") from None
+    except asyncio.CancelledError:
+        future.add_done_callback(discard_spool)
+        raise
+
+# Modified to support both sync and async operation
+async def handle_github_repo_async(github_url: Optional[str] = None) -> None:
+    if not github_url:
+        print('No url, ingestion Skipped')
+        return
+    path = await fetch_github_repo_async(github_url)
+    try:
+        await apublish_results([path])
+        print('data written')
+    except Exception as e:
+        print('error in writing data')
+        raise
+
+# Keep synchronous version for non-async contexts
+def handle_github_repo(github_url: Optional[str] = None) -> None:
+    if not github_url:
+        print('No url, ingestion Skipped')
+        return
+    path = fetch_github_repo(github_url)
+    try:
+        publish_results([path])
+        print('data written')
+    except Exception as e:
+        print('error in writing data')
+        raise
+        
+def scrape_url(url) -> list:
+    """Blocking FireCrawl scrape of one page"""
+    loader = FireCrawlLoader(
+    api_key=FIRECRAWL_API_KEY, url=url, mode="scrape"
+    )
+    return list(loader.lazy_load())
+
+async def fetch_url_async(url) -> str:
+    async def fetch(path):
+        loop = asyncio.get_running_loop()
+        try:
+            pages = await asyncio.wait_for(loop.run_in_executor(INGEST_EXECUTOR, scrape_url, url), INGEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Scraping {url} took longer than {INGEST_TIMEOUT:.0f}s") from None
+        write_jsonl(page_documents(url, pages), path)
+
+    return await acached(url_key(url), "url", url, fetch)
+
+# Function to handle general URLs
+async def handle_url_async(url):
+    await apublish_results([await fetch_url_async(url)])
+
+# Synchronous version for backward compatibility
+def handle_url(url):
+    publish_results([cached(url_key(url), "url", url, lambda path: write_jsonl(page_documents(url, scrape_url(url)), path))])
+
+async def fetch_topic_async(instruction, query) -> str:
+    async def fetch(path):
+        search = TavilySearchResults(max_results=5, search_depth="advanced", include_answer=True)
+        # ainvoke uses Tavily's aiohttp client, so waiting on it does not block the loop
+        try:
+            search_result = await asyncio.wait_for(search.ainvoke(instruction + ':-' + query), INGEST_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"Searching for {query!r} took longer than {INGEST_TIMEOUT:.0f}s") from None
+        write_jsonl(search_documents(query, search_result), path)
+
+    return await acached(topic_key(instruction, query), "topic", query, fetch)
+
+# Async version of handle_topic
+async def handle_topic_async(instruction, query):
+    await apublish_results([await fetch_topic_async(instruction, query)])
+
+# Function to handle topics (synchronous version)
+def handle_topic(instruction, query):
+    search = TavilySearchResults(max_results=5, search_depth="advanced", include_answer=True)
+    publish_results([cached(
+        topic_key(instruction, query), "topic", query,
+        lambda path: write_jsonl(search_documents(query, search.invoke(instruction + ':-' + query)), path)
+    )])
+
+# Async version of process_classification_result
+async def process_classification_result_async(result: dict):
+    input_type = result["type"]
+    input_url = result["input"] if input_type in ["github_repo", "url"] else ""
+
+    if input_type == "github_repo":
+        await handle_github_repo_async(result["input"])
+    elif input_type == "url":
+        await handle_url_async(result["input"])
+    elif input_type == "topic":
+        await handle_topic_async(result["instruction"], result["input"])
+    else:
+        print("Unknown input type.")
+    
+    return result["instruction"], result['input'], input_type, input_url
+
+# Keep synchronous version for backward compatibility
+def process_classification_result(result: dict):
+    input_type = result["type"]
+    input_url = result["input"] if input_type in ["github_repo", "url"] else ""
+
+    if input_type == "github_repo":
+        handle_github_repo(result["input"])
+    elif input_type == "url":
+        handle_url(result["input"])
+    elif input_type == "topic":
+        handle_topic(result["instruction"], result["input"])
+    else:
+        print("Unknown input type.")
+    
+    return result["instruction"], result['input'], input_type, input_url
+
+
+def split_sources(user_input: str) -> List[str]:
+    """Sources in one message: every line that is a URL, every http(s):// link of a line made only of them, and the other lines as one topic"""
+    urls, topic = [], []
+    for line in user_input.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        tokens = [token for token in re.split(r'[\s,]+', line) if token]
+        if is_url(line):
+            urls.append(line)
+        elif all(re.match(r'https?://', token, re.IGNORECASE) and URL_PATTERN.match(token) for token in tokens):
+            urls.extend(tokens)
+        else:
+            topic.append(line)
+    return urls + ([" ".join(topic)] if topic else [])
+
+def source_host(result: dict) -> str:
+    """Host a source is fetched from, for the per-host limit"""
+    if result["type"] == "topic":
+        return "api.tavily.com"
+    url = result["input"]
+    return (urlparse(url if "://" in url else "https://" + url).hostname or url).lower()
+
+async def fetch_source_async(result: dict) -> str:
+    """Spool file with the documents of one classified source"""
+    if result["type"] == "github_repo":
+        return await fetch_github_repo_async(result["input"])
+    elif result["type"] == "url":
+        return await fetch_url_async(result["input"])
+    elif result["type"] == "topic":
+        return await fetch_topic_async(result["instruction"], result["input"])
+    raise ValueError(f"Unknown input type: {result['type']}")
+
+async def collect_sources_async(results: List[dict]) -> List[dict]:
+    """Fetch every classified source concurrently and write them to one corpus.
+
+    At most INGEST_CONCURRENCY fetches run at once and at most INGEST_PER_HOST
+    against the same host. Each source is streamed to its own spool file; the
+    spool files are then concatenated into ./data/results.jsonl, with one
+    summary entry per source in
+    ./data/sources.json; a failed source is recorded and skipped, and only if
+    every source fails is an error raised.
+    """
+    limit = asyncio.Semaphore(INGEST_CONCURRENCY)
+    host_limits = {}
+
+    loop = asyncio.get_running_loop()
+
+    async def fetch(index, result):
+        host = source_host(result)
+        host_limit = host_limits.setdefault(host, asyncio.Semaphore(INGEST_PER_HOST))
+        # Waiting for a busy host does not hold one of the global slots
+        async with host_limit, limit:
+            start = time.perf_counter()
+            path, documents, chars, error = None, 0, 0, None
+            try:
+                path = await fetch_source_async(result)
+                documents, chars = await loop.run_in_executor(FILE_EXECUTOR, jsonl_stats, path)
+                if not chars:
+                    error = ValueError(f"No content collected from {result['input']}")
+            except Exception as e:
+                error = e
+            if error and path:
+                remove_spool(path)
+        entry = {
+            "source": index,
+            "type": result["type"],
+            "input": result["input"],
+            "host": host,
+            "documents": documents,
+            "chars": chars,
+            "seconds": round(time.perf_counter() - start, 2),
+            "error": f"{type(error).__name__}: {error}" if error else None,
+        }
+        if error:
+            print(f"Source {index} ({result['input']}) failed: {entry['error']}")
+        return entry, path, error
+
+    fetched = await asyncio.gather(*(fetch(i, result) for i, result in enumerate(results, 1)))
+    errors = [error for _, _, error in fetched if error]
+    if len(errors) == len(fetched):
+        raise errors[0] if errors else ValueError("No sources given")
+
+    sources = [entry for entry, _, _ in fetched]
+    await loop.run_in_executor(FILE_EXECUTOR, publish_sources, [path for _, path, error in fetched if error is None], sources)
+    print(f'data written from {len(fetched) - len(errors)} of {len(fetched)} sources')
+    return sources
+
+def query_saver(query: str, input_type: str, input_url: str, sources: Optional[List[str]] = None):
+    # Ensure the directory exists
+    os.makedirs('./query', exist_ok=True)
+    with open('./query/query.json', 'w', encoding='utf-8') as file:
+        json.dump({
+            "query": query,
+            "input_type": input_type,
+            "input_url": input_url,
+            "sources": sources or ([input_url] if input_url else [])
+        }, file, indent=4)
+
+# Add async version of run_data_collection
+async def run_data_collection_async(user_inst=None, user_rep: Union[str, List[str], None] = None):
+    """Collect one or several sources; user_rep is a message (one source per line) or a list of sources"""
+    # Get user input
+    if user_inst and user_rep:
+        user_instruction = user_inst
+        user_response = user_rep
+    else:
+        user_instruction = input('enter instructions:- ')
+        user_response = input('enter input (several sources separated by spaces):-')
+
+    # Classify every source
+    inputs = user_response if isinstance(user_response, list) else split_sources(user_response)
+    results = [classify_input(user_instruction, source) for source in inputs]
+
+    sources = await collect_sources_async(results)
+    types = sorted({result["type"] for result in results})
+    input_type = types[0] if len(types) == 1 else "mixed"
+    urls = [entry["input"] for entry in sources if entry["type"] != "topic" and entry["error"] is None]
+    query_saver(user_instruction, input_type, urls[0] if urls else "", [entry["input"] for entry in sources])
+    
+    # Return a message about the data collection
+    failed = [f"\n- {entry['input']}: {entry['error']}" for entry in sources if entry["error"]]
+    return (
+        f"Data collected successfully!\nType: {input_type}\nQuery: {user_instruction}\n"
+        f"Sources: {len(sources) - len(failed)} of {len(sources)}" + "".join(failed)
+    )
+  
+def run_data_collection(user_inst=None, user_rep=None):
+    # Get user input
+    if user_inst and user_rep:
+        user_instruction = user_inst
+        user_response = user_rep
+    else:
+        user_instruction = input('enter instructions:- ')
+        user_response = input('enter input:-')
+
+    # Classify input
+    result = classify_input(user_instruction, user_response)
+
+    user_prompt, user_input, input_type, input_url = process_classification_result(result)
+    query_saver(user_prompt, input_type, input_url)
+    
+    # Return a message about the data collection
+    return f"Data collected successfully!\nType: {input_type}\nQuery: {user_prompt}"
+
+if __name__ == '__main__':
     run_data_collection()
\ No newline at end of file
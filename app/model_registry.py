@@ -0,0 +1,74 @@
+from langchain_groq import ChatGroq
+from langchain_huggingface import HuggingFaceEmbeddings
+import logging
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+# Use os.getenv() to avoid KeyError
+GROQ_API_KEY = os.getenv('GROQ_API_KEY')
+LLM_MODEL = os.getenv('LLM_MODEL', 'llama3-70b-8192')
+EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-mpnet-base-v2')
+
+logger = logging.getLogger(__name__)
+
+# Heavy objects shared by every pipeline in this process.
+# They are stateless between calls, so one instance per configuration is enough.
+_embeddings = {}
+_llms = {}
+_embeddings_lock = threading.Lock()
+_llms_lock = threading.Lock()
+
+
+def get_embeddings(model_name: str = EMBEDDING_MODEL) -> HuggingFaceEmbeddings:
+    """Return the shared embedding model, loading it on first use"""
+    embeddings = _embeddings.get(model_name)
+    if embeddings is not None:
+        return embeddings
+
+    with _embeddings_lock:
+        # Another thread may have loaded it while we were waiting
+        embeddings = _embeddings.get(model_name)
+        if embeddings is None:
+            start = time.perf_counter()
+            embeddings = HuggingFaceEmbeddings(model_name=model_name)
+            _embeddings[model_name] = embeddings
+            logger.info(f"Loaded embedding model {model_name} in {time.perf_counter() - start:.2f}s")
+    return embeddings
+
+
+def get_llm(model: str = LLM_MODEL, temperature: float = 0.7, max_tokens: int = None) -> ChatGroq:
+    """Return the shared Groq chat client for the given settings"""
+    key = (model, temperature, max_tokens)
+    llm = _llms.get(key)
+    if llm is not None:
+        return llm
+
+    with _llms_lock:
+        llm = _llms.get(key)
+        if llm is None:
+            llm = ChatGroq(
+                model=model,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                api_key=GROQ_API_KEY
+            )
+            _llms[key] = llm
+            logger.info(f"Created Groq client for {model} (temperature={temperature}, max_tokens={max_tokens})")
+    return llm
+
+
+def warm_up() -> None:
+    """Load the embedding model and LLM clients ahead of the first request"""
+    start = time.perf_counter()
+    embeddings = get_embeddings()
+    # A first encode pays for lazy initialisation inside sentence-transformers
+    embeddings.embed_query("warm up")
+    get_llm(temperature=0.7, max_tokens=1024)
+    get_llm(temperature=0.7)
+    logger.info(f"Model registry warmed up in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,58 @@
+from typing import List, Optional
+import os
+import re
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+# "llm" always asks the LLM, "auto" skips it for simple instructions, "heuristic" never calls it
+QUERY_ANALYSIS_MODE = os.getenv('QUERY_ANALYSIS_MODE', 'llm').lower()
+# Longer instructions are left to the LLM in "auto" mode
+HEURISTIC_MAX_WORDS = int(os.getenv('HEURISTIC_MAX_WORDS', '25'))
+
+# Words that hint at which part of an ingested source holds the answer.
+# gitingest output starts with the summary and file tree, so overview-style
+# questions go to the beginning.
+SECTION_HINTS = {
+    "end": ("conclusion", "conclude", "future", "roadmap", "license", "contributing", "citation", "contact", "references"),
+    "middle": ("implementation", "implement", "function", "class", "method", "code", "details", "internals", "algorithm"),
+    "beginning": ("overview", "introduction", "intro", "summary", "summarize", "about", "readme", "install", "setup", "features", "what is"),
+}
+
+# Signs that an instruction has several parts worth decomposing
+COMPOUND_MARKERS = re.compile(r'\b(and|versus|vs\.?|compare|comparison|difference|between|also|then)\b|[;?].*[;?]', re.IGNORECASE)
+
+
+def normalize_question(question: str) -> str:
+    """Canonical form of a question for cache keys"""
+    return re.sub(r'\s+', ' ', question).strip().strip('?.!').lower()
+
+
+def is_simple(question: str) -> bool:
+    words = question.split()
+    return 0 < len(words) <= HEURISTIC_MAX_WORDS and not COMPOUND_MARKERS.search(question)
+
+
+def guess_section(question: str) -> str:
+    text = question.lower()
+    for section in ("end", "middle", "beginning"):
+        if any(re.search(r'\b' + re.escape(hint) + r'\b', text) for hint in SECTION_HINTS[section]):
+            return section
+    return "beginning"
+
+
+def split_sub_questions(question: str) -> List[str]:
+    """Separate questions or clauses of an instruction, split on '?', ';', line breaks and full stops"""
+    parts = [re.sub(r'\s+', ' ', part).strip() for part in re.split(r'[?;\n]|\.\s', question)]
+    return [part for part in parts if len(part.split()) >= 3]
+
+
+def heuristic_analysis(question: str, force: bool = False) -> Optional[dict]:
+    """Query and section for a simple instruction without an LLM call, or None to fall back to the LLM"""
+    if not force and not is_simple(question):
+        return None
+    parts = split_sub_questions(question)
+    sub_queries = [{"query": part, "section": guess_section(part)} for part in parts] if len(parts) > 1 else []
+    return {"query": re.sub(r'\s+', ' ', question).strip(), "section": guess_section(question), "sub_queries": sub_queries}
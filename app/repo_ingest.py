@@ -0,0 +1,188 @@
+from typing import List, Optional, Tuple
+import fnmatch
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from ingest_cache import git_env, parse_repo_url
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+# Directories and file patterns that are never worth ingesting: VCS metadata,
+# dependencies, build output, lock files and binary assets
+DEFAULT_IGNORE_PATTERNS = {
+    ".git", ".svn", ".hg", "node_modules", "bower_components", "vendor", "__pycache__", "*.pyc", "*.pyo",
+    ".pytest_cache", ".mypy_cache", ".tox", "venv", ".venv", ".env", "*.egg-info", "dist", "build",
+    "target", ".next", ".idea", ".vscode", ".DS_Store", "*.lock", "package-lock.json", "yarn.lock",
+    "pnpm-lock.yaml", "poetry.lock", "Cargo.lock", "*.min.js", "*.min.css", "*.map", "*.png", "*.jpg",
+    "*.jpeg", "*.gif", "*.ico", "*.svg", "*.webp", "*.bmp", "*.pdf", "*.zip", "*.gz", "*.tar", "*.tgz",
+    "*.rar", "*.7z", "*.jar", "*.war", "*.class", "*.so", "*.dylib", "*.dll", "*.exe", "*.o", "*.a",
+    "*.mp3", "*.mp4", "*.wav", "*.mov", "*.avi", "*.woff", "*.woff2", "*.ttf", "*.eot", "*.bin", "*.pkl",
+    "*.pt", "*.onnx", "*.h5", "*.db", "*.sqlite",
+}
+
+# Bytes of file content written per repository; the rest of the files are left out
+REPO_MAX_BYTES = int(os.getenv('REPO_MAX_BYTES', str(5 * 1024 * 1024)))
+# Files larger than this are skipped
+REPO_MAX_FILE_BYTES = int(os.getenv('REPO_MAX_FILE_BYTES', str(512 * 1024)))
+
+logger = logging.getLogger(__name__)
+
+
+def _ignored(relative_path: str) -> bool:
+    return any(fnmatch.fnmatch(part, pattern) for part in relative_path.split('/') for pattern in DEFAULT_IGNORE_PATTERNS)
+
+
+def _remaining(deadline: float, action: str) -> float:
+    """Seconds left before the deadline, raising TimeoutError once it has passed"""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError(f"Repository ingest ran out of time before {action}")
+    return remaining
+
+
+def _git(args: List[str], deadline: float, cwd: Optional[str] = None) -> str:
+    """Run one git command with whatever is left of the ingest's deadline"""
+    completed = subprocess.run(
+        ["git", *args], cwd=cwd, capture_output=True, text=True, timeout=_remaining(deadline, f"git {args[0]}"),
+        env=git_env(),
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"git {args[0]} failed: {completed.stderr.strip()}")
+    return completed.stdout.strip()
+
+
+def _is_binary(path: str) -> bool:
+    with open(path, 'rb') as file:
+        return b"\0" in file.read(8192)
+
+
+def list_files(root: str, subpath: str = "", max_file_bytes: int = REPO_MAX_FILE_BYTES) -> Tuple[List[Tuple[str, int]], int]:
+    """(relative path, size) of the text files worth ingesting, README first then shallow files first, and the number skipped.
+
+    A sub-path naming a single file (a ``/blob/<ref>/<file>`` URL) yields just that file.
+    """
+    files, skipped = [], 0
+    start = os.path.join(root, subpath)
+    if subpath and not os.path.exists(start):
+        raise FileNotFoundError(f"{subpath} does not exist in the repository")
+    if os.path.isfile(start):
+        size = os.path.getsize(start)
+        if size == 0 or size > max_file_bytes or _is_binary(start):
+            return [], 1
+        return [(subpath.strip('/'), size)], 0
+    for directory, dirnames, filenames in os.walk(start):
+        relative_dir = os.path.relpath(directory, root).replace(os.sep, '/')
+        relative_dir = "" if relative_dir == "." else relative_dir + "/"
+        dirnames[:] = [name for name in dirnames if not _ignored(relative_dir + name)]
+        for name in filenames:
+            relative_path = relative_dir + name
+            full_path = os.path.join(directory, name)
+            if _ignored(relative_path) or os.path.islink(full_path):
+                continue
+            size = os.path.getsize(full_path)
+            if size == 0 or size > max_file_bytes or _is_binary(full_path):
+                skipped += 1
+                continue
+            files.append((relative_path, size))
+    files.sort(key=lambda item: (not os.path.basename(item[0]).lower().startswith("readme"), item[0].count('/'), item[0]))
+    return files, skipped
+
+
+def _tree(paths: List[str]) -> str:
+    """Indented directory tree of the given paths"""
+    lines, previous = [], []
+    for path in sorted(paths):
+        parts = path.split('/')
+        common = 0
+        while common < min(len(previous), len(parts) - 1) and previous[common] == parts[common]:
+            common += 1
+        for depth in range(common, len(parts) - 1):
+            lines.append("    " * depth + parts[depth] + "/")
+        lines.append("    " * (len(parts) - 1) + parts[-1])
+        previous = parts[:-1]
+    return "\n".join(lines)
+
+
+def stream_repository(github_url: str, output_path: str, max_bytes: int = REPO_MAX_BYTES,
+                      max_file_bytes: int = REPO_MAX_FILE_BYTES, deadline: Optional[float] = None,
+                      commit: Optional[str] = None) -> dict:
+    """Shallow-fetch a repository and write it to a JSONL file one document per file.
+
+    The first document is an overview with the commit and the file tree; every
+    file after it is its own document, so chunks never span two files. Files
+    are added in order until ``max_bytes`` of content is written, and only one
+    file is held in memory at a time. Returns counts of what was written.
+
+    ``deadline`` is a ``time.monotonic()`` value shared by every git command
+    and the file copy, so one repository cannot hold a worker for longer
+    than its caller waits; it defaults to 60 seconds from now. With a
+    ``commit`` SHA that exact commit is fetched instead of the URL's ref, so
+    the content matches a cache key pinned to it even if the ref moved since.
+    """
+    deadline = time.monotonic() + 60 if deadline is None else deadline
+    remote, name, ref, subpath = parse_repo_url(github_url)
+    workdir = tempfile.mkdtemp(prefix="repo-ingest-")
+    try:
+        _git(["init", "-q", workdir], deadline)
+        _git(["fetch", "-q", "--depth", "1", remote, commit or ref], deadline, cwd=workdir)
+        _git(["checkout", "-q", "FETCH_HEAD"], deadline, cwd=workdir)
+        fetched = _git(["rev-parse", "FETCH_HEAD"], deadline, cwd=workdir)
+        if commit and fetched != commit:
+            raise RuntimeError(f"Fetched {fetched} instead of the requested commit {commit} of {name}")
+        commit = fetched
+
+        files, skipped = list_files(workdir, subpath, max_file_bytes)
+        selected, total = [], 0
+        for relative_path, size in files:
+            if total + size > max_bytes:
+                break
+            selected.append(relative_path)
+            total += size
+        left_out = len(files) - len(selected)
+        kind = "File" if os.path.isfile(os.path.join(workdir, subpath)) else "Directory"
+
+        base_url = remote[:-len(".git")]
+        written = {"commit": commit, "files": 0, "chars": 0, "skipped": skipped, "left_out": left_out}
+        with open(output_path, 'w', encoding='utf-8') as output:
+            overview = (
+                f"Repository: {name}\nCommit: {commit}\n"
+                + (f"{kind}: {subpath}\n" if subpath else "")
+                + f"Files included: {len(selected)}"
+                + (f" ({left_out} more left out by the {max_bytes} byte budget)" if left_out else "")
+                + "\n\nDirectory structure:\n" + _tree(selected)
+            )
+            output.write(json.dumps({
+                "text": overview, "source": github_url, "title": name, "type": "github_repo",
+                "metadata": {"repo": name, "commit": commit},
+            }, ensure_ascii=False) + "\n")
+            for relative_path in selected:
+                _remaining(deadline, f"writing {relative_path}")
+                with open(os.path.join(workdir, relative_path), 'r', encoding='utf-8', errors='replace') as file:
+                    text = file.read()
+                if not text.strip():
+                    written["skipped"] += 1
+                    continue
+                output.write(json.dumps({
+                    "text": text,
+                    "source": f"{base_url}/blob/{commit}/{relative_path}",
+                    "title": f"{name}/{relative_path}",
+                    "type": "github_repo",
+                    "metadata": {"repo": name, "commit": commit, "path": relative_path},
+                }, ensure_ascii=False) + "\n")
+                written["files"] += 1
+                written["chars"] += len(text)
+        logger.info(
+            f"Ingested {name}@{commit[:8]}: {written['files']} files, {written['chars']} characters, "
+            f"{written['left_out']} left out by the budget, {written['skipped']} skipped"
+        )
+        return written
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
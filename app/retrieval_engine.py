@@ -0,0 +1,215 @@
+from langchain_core.documents import Document
+from typing import List, Optional, Tuple
+import numpy as np
+import logging
+import threading
+
+from vector_math import QuantizedMatrix, mmr, normalize_query, normalize_rows, top_k
+from ann_index import build_ann_index, recall_at_k, sample_queries
+
+logger = logging.getLogger(__name__)
+
+# Metadata key whose values get their own contiguous sub-matrix (and ANN index)
+PARTITION_KEY = "section"
+# Further metadata keys with a precomputed row index, so equality filters skip a scan
+INDEXED_KEYS = ("section", "source", "type")
+
+
+class SectionedSearchEngine:
+    """Cosine search over pre-normalized embeddings with metadata filter pushdown.
+
+    Rows are grouped into one contiguous matrix per section so a section
+    filter scans only that section's vectors. Other indexed keys map each
+    value to its rows; filters on any key are resolved to a row subset before
+    scoring. Sections above the ANN size threshold also get an IVF index,
+    and the section is kept only once, in the index's cluster order; smaller
+    ones are always searched exactly. The searchable copy and IVF index of
+    the full matrix are only built on the first unfiltered query.
+
+    With ``precision`` "float16" or "int8" the searchable copies are
+    quantized: a first pass over them keeps ``k * rescore_factor``
+    candidates, which are rescored against ``matrix`` at full precision.
+    ``matrix`` can then be a memmap of normalized vectors (``normalized=True``)
+    so the float32 data stays on disk.
+    """
+
+    def __init__(self, matrix: np.ndarray, documents: List[Document], partition_key: str = PARTITION_KEY,
+                 indexed_keys: Tuple[str, ...] = INDEXED_KEYS, precision: str = "float32",
+                 rescore_factor: int = 4, normalized: bool = False):
+        self.documents = documents
+        self.partition_key = partition_key
+        self.precision = precision if len(documents) else "float32"
+        self.rescore_factor = max(1, rescore_factor)
+        if not len(documents):
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+        else:
+            self.matrix = matrix if normalized else normalize_rows(matrix)
+        self.full = None  # (store, None, ann) for unfiltered queries, see _full
+        self.full_lock = threading.Lock()
+
+        # Column of metadata values per key, built once and compared with NumPy
+        self.columns = {}
+        self.row_index = {}
+        for key in set(indexed_keys) | {partition_key}:
+            column = self._column(key)
+            self.row_index[key] = {value: np.flatnonzero(column == value) for value in np.unique(column)}
+
+        self.partitions = {}
+        for value, rows in self.row_index[partition_key].items():
+            partition = self._searchable(rows)
+            ann = build_ann_index(partition)
+            if ann is not None:
+                # The IVF already holds the section in cluster order; keep that copy only
+                partition, rows = ann.vectors, rows[ann.detach_rows()]
+            self.partitions[value] = (partition, rows, ann)
+        logger.info(
+            f"Built search engine over {len(documents)} chunks, "
+            f"{partition_key} sizes: { {value: len(rows) for value, (_, rows, _) in self.partitions.items()} }"
+        )
+
+        self.stats = {"precision": self.precision}
+        self._update_memory_stats()
+        if self.precision != "float32":
+            self._report_quantization()
+
+    def _searchable(self, rows: Optional[np.ndarray]):
+        """Copy of the full matrix or of some rows in the search precision"""
+        if self.precision != "float32":
+            return QuantizedMatrix.quantize(self.matrix, self.precision, rows)
+        if rows is None:
+            return self.matrix
+        # Fancy indexing copies, so each partition is its own contiguous block
+        return np.ascontiguousarray(self.matrix[rows])
+
+    def _full(self):
+        """(store, None, ann) of the full matrix, built on first use"""
+        with self.full_lock:
+            if self.full is None:
+                store = self._searchable(None)
+                self.full = (store, None, build_ann_index(store))
+                logger.info("Built full-matrix search structures for unfiltered queries")
+                self._update_memory_stats()
+            return self.full
+
+    def _structures(self):
+        return ([self.full] if self.full is not None else []) + list(self.partitions.values())
+
+    def _vector_bytes(self) -> Tuple[int, int]:
+        """(bytes of vector data held in memory, bytes the same structures would hold at float32).
+
+        A memory-mapped full-precision matrix stays on disk and is not held,
+        while a float32 engine keeps the matrix in memory and searches it
+        directly for unfiltered queries instead of a quantized copy.
+        """
+        held = 0 if isinstance(self.matrix, np.memmap) else self.matrix.nbytes
+        float32 = self.matrix.size * 4
+        for store, rows, ann in self._structures():
+            if store is not self.matrix:
+                held += store.nbytes
+                float32 += 0 if rows is None else store.size * 4
+            if ann is not None:
+                held += ann.centroids.nbytes + (0 if ann.vectors is store else ann.vectors.nbytes)
+                float32 += ann.centroids.nbytes + (0 if ann.vectors is store else ann.vectors.size * 4)
+        return held, float32
+
+    def memory_bytes(self) -> int:
+        """Bytes of vector data held in memory; a memory-mapped full-precision matrix is not counted"""
+        return self._vector_bytes()[0]
+
+    def _update_memory_stats(self):
+        held, float32 = self._vector_bytes()
+        self.stats.update(vector_mb=round(held / 2**20, 1), float32_mb=round(float32 / 2**20, 1))
+
+    def _report_quantization(self, k: int = 4):
+        """Log memory saved by quantization and recall@k against exact float32 search.
+
+        Recall is measured on the largest section, so the report does not build the full-matrix structures.
+        """
+        value, rows = max(self.row_index[self.partition_key].items(), key=lambda item: len(item[1]))
+        matrix = self.matrix[rows]
+
+        def search(query, k):
+            # Section results are global rows; rows is sorted, so searchsorted maps them to positions in matrix
+            best, scores = self._candidates(query, k, {self.partition_key: value}, False)
+            return np.searchsorted(rows, best), scores
+
+        queries = sample_queries(matrix, count=min(50, len(rows)))
+        recall = recall_at_k(matrix, search, queries, k)
+        self.stats["recall"] = round(recall, 4)
+        logger.info(
+            f"{self.precision} vectors use {self.stats['vector_mb']} MB instead of {self.stats['float32_mb']} MB, "
+            f"recall@{k} after rescoring: {recall:.3f}"
+        )
+
+    def _column(self, key: str) -> np.ndarray:
+        if key not in self.columns:
+            self.columns[key] = np.array([str(doc.metadata.get(key)) for doc in self.documents], dtype=object)
+        return self.columns[key]
+
+    def _plan(self, filter: Optional[dict]):
+        """Resolve a filter to the (matrix, rows, ann) to score; rows is None for the full matrix"""
+        filter = {key: str(value) for key, value in (filter or {}).items()}
+        if not filter:
+            return self._full()
+
+        # A lone section predicate maps straight onto its sub-index
+        if set(filter) == {self.partition_key}:
+            return self.partitions.get(filter[self.partition_key], (None, np.empty(0, dtype=np.int64), None))
+
+        rows = None
+        for key, value in filter.items():
+            if key in self.row_index:
+                matched = self.row_index[key].get(value, np.empty(0, dtype=np.int64))
+            else:
+                matched = np.flatnonzero(self._column(key) == value)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+            if len(rows) == 0:
+                break
+        return self.matrix[rows], rows, None
+
+    def _candidates(self, query: np.ndarray, k: int, filter: Optional[dict], exact: bool):
+        """Row ids and scores of the k best rows matching the filter, best first"""
+        store, rows, ann = self._plan(filter)
+        if rows is not None and len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        quantized = isinstance(store, QuantizedMatrix)
+        if exact and quantized:
+            # Exhaustive search at full precision, for reference results
+            store = self.matrix if rows is None else self.matrix[rows]
+            quantized = False
+        fetch = k * self.rescore_factor if quantized else k
+        if ann is not None and not exact:
+            best, scores = ann.search(query, fetch)
+        else:
+            best, scores = top_k(store, query, fetch)
+        if rows is not None:
+            best = rows[best]
+
+        if quantized:
+            # Rescore the short list at full precision; sorted rows read a memmap sequentially
+            shortlist = np.sort(best)
+            order, scores = top_k(self.matrix[shortlist], query, k)
+            best = shortlist[order]
+        return best, scores
+
+    def search(self, embedding, k: int = 4, filter: Optional[dict] = None, exact: bool = False) -> List[Tuple[Document, float]]:
+        """Top-k (document, score) pairs, optionally restricted by metadata equality.
+
+        ``exact=True`` bypasses the ANN index and quantization.
+        """
+        query = normalize_query(embedding)
+        best, scores = self._candidates(query, k, filter, exact)
+        return [(self.documents[row], float(score)) for row, score in zip(best, scores)]
+
+    def mmr_search(self, embedding, k: int = 4, fetch_k: int = 20, lambda_mult: float = 0.5,
+                   filter: Optional[dict] = None, exact: bool = False) -> List[Tuple[Document, float]]:
+        """k diverse (document, score) pairs chosen by MMR from the fetch_k most similar chunks.
+
+        ``lambda_mult`` = 1 is plain similarity order, 0 is maximal diversity.
+        """
+        query = normalize_query(embedding)
+        best, scores = self._candidates(query, max(k, fetch_k), filter, exact)
+        order = mmr(np.asarray(self.matrix[best]), query, k, lambda_mult, relevance=scores)
+        best, scores = best[order], scores[order]
+        return [(self.documents[row], float(score)) for row, score in zip(best, scores)]
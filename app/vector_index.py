@@ -0,0 +1,351 @@
+from abc import ABC, abstractmethod
+from langchain_core.documents import Document
+from typing import Dict, List, Optional
+import numpy as np
+import json
+import logging
+import os
+import threading
+
+from storage import SegmentManifest, read_json, source_id, write_json
+from retrieval_engine import SectionedSearchEngine
+from vector_math import mmr, normalize_query, normalize_rows
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+VECTOR_INDEX_BACKEND = os.getenv('VECTOR_INDEX_BACKEND', 'local')  # "local" or "chroma"
+VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', './index')
+# Maximal marginal relevance: candidates considered and relevance/diversity trade-off (1 = similarity only)
+MMR_FETCH_K = int(os.getenv('MMR_FETCH_K', '20'))
+MMR_LAMBDA = float(os.getenv('MMR_LAMBDA', '0.5'))
+# In-memory precision of the local index: "float32", "float16" or "int8". Quantized indexes
+# keep full-precision vectors memory-mapped on disk and rescore a short list with them.
+VECTOR_PRECISION = os.getenv('VECTOR_PRECISION', 'float32').lower()
+# Candidates kept from the quantized pass per requested result
+VECTOR_RESCORE_FACTOR = int(os.getenv('VECTOR_RESCORE_FACTOR', '4'))
+
+logger = logging.getLogger(__name__)
+
+
+class VectorIndex(ABC):
+    """Persistent vector index holding the chunks of every indexed source.
+
+    Vectors are added in batches and deleted per source; ``fingerprint``
+    records the content version that was fully indexed so unchanged sources
+    can be skipped. A source whose batches were not all written has no
+    fingerprint and is re-indexed on the next run.
+    """
+
+    @abstractmethod
+    def sources(self) -> Dict[str, str]:
+        """Map of indexed source -> fingerprint"""
+
+    def has_source(self, source: str, fingerprint: str) -> bool:
+        return self.sources().get(source) == fingerprint
+
+    @abstractmethod
+    def append_documents(self, source: str, documents: List[Document], vectors: List[List[float]]):
+        """Add a batch of chunks to a source"""
+
+    @abstractmethod
+    def set_fingerprint(self, source: str, fingerprint: str):
+        """Mark a source as completely indexed at the given content version"""
+
+    @abstractmethod
+    def delete_source(self, source: str):
+        """Remove every chunk and the fingerprint of a source"""
+
+    def add_documents(self, source: str, fingerprint: str, documents: List[Document], vectors: List[List[float]]):
+        """Replace the chunks stored for a source in one go"""
+        self.delete_source(source)
+        self.append_documents(source, documents, vectors)
+        self.set_fingerprint(source, fingerprint)
+
+    @abstractmethod
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None) -> List[Document]:
+        """Return the k chunks closest to the embedding, optionally restricted by metadata equality"""
+
+    @abstractmethod
+    def max_marginal_relevance_search_by_vector(self, embedding: List[float], k: int = 4, fetch_k: int = MMR_FETCH_K,
+                                                lambda_mult: float = MMR_LAMBDA, filter: Optional[dict] = None) -> List[Document]:
+        """Return k relevant but mutually diverse chunks chosen from the fetch_k closest"""
+
+    @abstractmethod
+    def get_by_ids(self, chunk_ids: List[str]) -> List[Document]:
+        """Fetch stored chunks by chunk id, skipping unknown ids"""
+
+    @abstractmethod
+    def get_vectors(self, chunk_ids: List[str]) -> np.ndarray:
+        """Unit-length vectors of the given chunks, one row per id"""
+
+    def search(self, query: str, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+               search_type: str = "similarity", fetch_k: int = MMR_FETCH_K, lambda_mult: float = MMR_LAMBDA) -> List[Document]:
+        """Retrieve chunks for a query; plain vector indexes only use the embedding.
+
+        ``search_type`` is "similarity" or "mmr".
+        """
+        if search_type == "mmr":
+            return self.max_marginal_relevance_search_by_vector(
+                embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter
+            )
+        return self.similarity_search_by_vector(embedding, k=k, filter=filter)
+
+
+class LocalVectorIndex(VectorIndex):
+    """NumPy index stored as segments (vectors + chunk json) per source, one per appended batch"""
+
+    def __init__(self, directory: str = VECTOR_INDEX_DIR, precision: str = VECTOR_PRECISION):
+        self.directory = directory
+        self.precision = precision
+        self.segments_dir = os.path.join(directory, 'segments')
+        self.manifest = SegmentManifest(os.path.join(directory, 'sources.json'), count=0)
+        self.full_precision_path = os.path.join(directory, 'full_precision.f32')
+        self.lock = threading.RLock()
+        self.engine = None
+        self.rows_by_id = {}
+
+    def _segment_paths(self, segment: str, part: int):
+        return (
+            os.path.join(self.segments_dir, f"{segment}.{part}.npy"),
+            os.path.join(self.segments_dir, f"{segment}.{part}.json")
+        )
+
+    def _load_segments(self):
+        """Build the search engine from every segment on first use"""
+        if self.engine is not None:
+            return
+        matrices, documents = [], []
+        for source, segment, part in self.manifest.parts():
+            vectors_path, docs_path = self._segment_paths(segment, part)
+            try:
+                # Quantized engines copy segments to disk block by block, so they need not be loaded
+                vectors = np.load(vectors_path, mmap_mode='r' if self.precision != 'float32' else None)
+                with open(docs_path, 'r', encoding='utf-8') as file:
+                    chunks = json.load(file)
+            except (FileNotFoundError, ValueError) as e:
+                logger.warning(f"Skipping unreadable segment for {source}: {str(e)}")
+                continue
+            matrices.append(vectors)
+            documents.extend(Document(page_content=c["page_content"], metadata=c["metadata"]) for c in chunks)
+        if self.precision != 'float32' and documents:
+            matrix = self._write_full_precision(matrices)
+            self.engine = SectionedSearchEngine(
+                matrix, documents, precision=self.precision, rescore_factor=VECTOR_RESCORE_FACTOR, normalized=True
+            )
+        else:
+            matrix = np.vstack(matrices) if matrices else np.zeros((0, 0), dtype=np.float32)
+            self.engine = SectionedSearchEngine(matrix, documents)
+        self.rows_by_id = {doc.metadata.get("chunk_id"): row for row, doc in enumerate(documents)}
+        logger.info(f"Loaded {len(documents)} indexed chunks")
+
+    def _write_full_precision(self, matrices) -> np.memmap:
+        """Concatenate normalized segment vectors into one file and memory-map it read-only"""
+        shape = (sum(len(vectors) for vectors in matrices), matrices[0].shape[1])
+        tmp_path = self.full_precision_path + '.tmp'
+        output = np.memmap(tmp_path, dtype=np.float32, mode='w+', shape=shape)
+        row = 0
+        for vectors in matrices:
+            output[row:row + len(vectors)] = normalize_rows(vectors)
+            row += len(vectors)
+        output.flush()
+        del output
+        os.replace(tmp_path, self.full_precision_path)
+        return np.memmap(self.full_precision_path, dtype=np.float32, mode='r', shape=shape)
+
+    def sources(self) -> Dict[str, str]:
+        with self.lock:
+            return self.manifest.fingerprints()
+
+    def append_documents(self, source, documents, vectors):
+        if not documents:
+            return
+        with self.lock:
+            entry = self.manifest.entry(source)
+            vectors_path, docs_path = self._segment_paths(entry["id"], entry["parts"])
+            os.makedirs(self.segments_dir, exist_ok=True)
+            np.save(vectors_path, np.asarray(vectors, dtype=np.float32).reshape(len(documents), -1))
+            write_json(docs_path, [{"page_content": d.page_content, "metadata": d.metadata} for d in documents])
+            entry["parts"] += 1
+            entry["count"] += len(documents)
+            self.manifest.save()
+            # Rebuild the search engine lazily on the next search
+            self.engine = None
+
+    def set_fingerprint(self, source, fingerprint):
+        with self.lock:
+            entry = self.manifest.entry(source)
+            entry["fingerprint"] = fingerprint
+            self.manifest.save()
+            logger.info(f"Indexed {entry['count']} chunks for {source}")
+
+    def delete_source(self, source):
+        with self.lock:
+            entry = self.manifest.pop(source)
+            if entry is None:
+                return
+            for part in range(entry["parts"]):
+                for path in self._segment_paths(entry["id"], part):
+                    if os.path.exists(path):
+                        os.remove(path)
+            self.manifest.save()
+            self.engine = None
+            logger.info(f"Removed {source} from the vector index")
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        with self.lock:
+            self._load_segments()
+            engine = self.engine
+        return [doc for doc, _ in engine.search(embedding, k=k, filter=filter)]
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=MMR_FETCH_K, lambda_mult=MMR_LAMBDA, filter=None):
+        with self.lock:
+            self._load_segments()
+            engine = self.engine
+        return [doc for doc, _ in engine.mmr_search(embedding, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, filter=filter)]
+
+    def get_by_ids(self, chunk_ids):
+        with self.lock:
+            self._load_segments()
+            documents, rows_by_id = self.engine.documents, self.rows_by_id
+        return [documents[rows_by_id[chunk_id]] for chunk_id in chunk_ids if chunk_id in rows_by_id]
+
+    def get_vectors(self, chunk_ids):
+        with self.lock:
+            self._load_segments()
+            matrix, rows_by_id = self.engine.matrix, self.rows_by_id
+        return matrix[[rows_by_id[chunk_id] for chunk_id in chunk_ids]]
+
+
+class ChromaVectorIndex(VectorIndex):
+    """Index backed by a persistent chromadb collection"""
+
+    def __init__(self, directory: str = VECTOR_INDEX_DIR, collection_name: str = 'devecho'):
+        self.directory = directory
+        self.collection_name = collection_name
+        self.manifest_path = os.path.join(directory, 'chroma_sources.json')
+        self.lock = threading.RLock()
+        self.collection = None
+        self.manifest = None
+
+    def _connect(self):
+        if self.collection is not None:
+            return
+        import chromadb  # Only needed when this backend is selected
+
+        client = chromadb.PersistentClient(path=os.path.join(self.directory, 'chroma'))
+        self.collection = client.get_or_create_collection(
+            self.collection_name, metadata={"hnsw:space": "cosine"}
+        )
+        self.manifest = read_json(self.manifest_path, {})
+        logger.info(f"Opened chroma collection {self.collection_name} with {self.collection.count()} chunks")
+
+    def _save_manifest(self):
+        write_json(self.manifest_path, self.manifest, indent=4)
+
+    def sources(self):
+        with self.lock:
+            self._connect()
+            return dict(self.manifest)
+
+    def append_documents(self, source, documents, vectors):
+        if not documents:
+            return
+        with self.lock:
+            self._connect()
+            segment = source_id(source)
+            self.collection.add(
+                ids=[d.metadata.get("chunk_id", f"{segment}:{i}") for i, d in enumerate(documents)],
+                embeddings=[list(map(float, v)) for v in vectors],
+                documents=[d.page_content for d in documents],
+                metadatas=[{**d.metadata, "source": source} for d in documents]
+            )
+
+    def set_fingerprint(self, source, fingerprint):
+        with self.lock:
+            self._connect()
+            self.manifest[source] = fingerprint
+            self._save_manifest()
+            logger.info(f"Indexed chunks for {source}")
+
+    def delete_source(self, source):
+        with self.lock:
+            self._connect()
+            self.collection.delete(where={"source": source})
+            if self.manifest.pop(source, None) is not None:
+                self._save_manifest()
+            logger.info(f"Removed {source} from the vector index")
+
+    @staticmethod
+    def _where(filter):
+        """Chroma where clause for a metadata equality filter"""
+        if filter and len(filter) > 1:
+            return {"$and": [{key: value} for key, value in filter.items()]}
+        return dict(filter) if filter else None
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        with self.lock:
+            self._connect()
+        # Filters are pushed down to chroma's metadata index
+        where = self._where(filter)
+        result = self.collection.query(query_embeddings=[list(map(float, embedding))], n_results=k, where=where)
+        return [
+            Document(page_content=text, metadata=metadata or {})
+            for text, metadata in zip(result["documents"][0], result["metadatas"][0])
+        ]
+
+    def max_marginal_relevance_search_by_vector(self, embedding, k=4, fetch_k=MMR_FETCH_K, lambda_mult=MMR_LAMBDA, filter=None):
+        with self.lock:
+            self._connect()
+        where = self._where(filter)
+        result = self.collection.query(
+            query_embeddings=[list(map(float, embedding))], n_results=max(k, fetch_k), where=where,
+            include=["documents", "metadatas", "embeddings", "distances"]
+        )
+        if not result["ids"][0]:
+            return []
+        # Cosine space: similarity = 1 - distance
+        relevance = 1 - np.asarray(result["distances"][0], dtype=np.float32)
+        order = mmr(normalize_rows(result["embeddings"][0]), normalize_query(embedding), k, lambda_mult, relevance)
+        return [
+            Document(page_content=result["documents"][0][i], metadata=result["metadatas"][0][i] or {})
+            for i in order
+        ]
+
+    def get_by_ids(self, chunk_ids):
+        with self.lock:
+            self._connect()
+        if not chunk_ids:
+            return []
+        result = self.collection.get(ids=list(chunk_ids), include=["documents", "metadatas"])
+        by_id = {
+            chunk_id: Document(page_content=text, metadata=metadata or {})
+            for chunk_id, text, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        }
+        return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+    def get_vectors(self, chunk_ids):
+        with self.lock:
+            self._connect()
+        result = self.collection.get(ids=list(chunk_ids), include=["embeddings"])
+        by_id = dict(zip(result["ids"], result["embeddings"]))
+        return normalize_rows([by_id[chunk_id] for chunk_id in chunk_ids])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_vector_index() -> VectorIndex:
+    """Return the process-wide index for the configured backend"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            if VECTOR_INDEX_BACKEND == 'chroma':
+                _index = ChromaVectorIndex()
+            else:
+                _index = LocalVectorIndex()
+            logger.info(f"Using {VECTOR_INDEX_BACKEND} vector index backend")
+        return _index
@@ -0,0 +1,112 @@
+from langchain_core.embeddings import Embeddings
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+# Chunks per encode call; batches hold chunks of similar length to limit padding
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '64'))
+# Worker processes for large ingests; 0 or 1 embeds in the calling process
+EMBED_WORKERS = int(os.getenv('EMBED_WORKERS', '0'))
+# Below this many chunks per call the pool is not worth its transfer cost. The default,
+# two batches, keeps it well below STREAM_BUFFER_CHUNKS, the most the pipeline sends per call.
+EMBED_PARALLEL_MIN_CHUNKS = int(os.getenv('EMBED_PARALLEL_MIN_CHUNKS', str(2 * EMBED_BATCH_SIZE)))
+
+logger = logging.getLogger(__name__)
+
+# Model loaded once inside each worker process
+_worker_embeddings = None
+
+
+def _init_worker(model_name: str, threads: int):
+    global _worker_embeddings
+    try:
+        import torch
+        # Split the cores between workers instead of every worker using all of them
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from model_registry import get_embeddings
+    _worker_embeddings = get_embeddings(model_name)
+
+
+def _embed_batch(texts: List[str]) -> List[List[float]]:
+    return _worker_embeddings.embed_documents(texts)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(model_name: str, workers: int) -> ProcessPoolExecutor:
+    """Process pool shared by every executor in this process, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # spawn avoids forking a parent that already holds torch thread pools
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model_name, threads)
+            )
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+            logger.info(f"Started {workers} embedding worker processes ({threads} threads each)")
+        return _pool
+
+
+def length_sorted_batches(texts: List[str], batch_size: int) -> List[List[int]]:
+    """Indices of texts grouped into batches of similar length"""
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings wrapper that batches documents by length and can fan out to worker processes"""
+
+    def __init__(self, embeddings: Embeddings, batch_size: int = EMBED_BATCH_SIZE, workers: int = EMBED_WORKERS):
+        self.embeddings = embeddings
+        self.model_name = getattr(embeddings, 'model_name', type(embeddings).__name__)
+        self.batch_size = max(1, batch_size)
+        self.workers = workers
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        start = time.perf_counter()
+        batches = length_sorted_batches(texts, self.batch_size)
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+
+        parallel = self.workers > 1 and len(texts) >= EMBED_PARALLEL_MIN_CHUNKS
+        if parallel:
+            pool = _get_pool(self.model_name, self.workers)
+            results = list(pool.map(_embed_batch, batch_texts))
+        else:
+            results = [self.embeddings.embed_documents(batch) for batch in batch_texts]
+
+        # Put vectors back in input order
+        vectors = [None] * len(texts)
+        for batch, batch_vectors in zip(batches, results):
+            for i, vector in zip(batch, batch_vectors):
+                vectors[i] = vector
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Embedded {len(texts)} chunks in {elapsed:.2f}s "
+            f"({len(texts) / elapsed if elapsed else 0:.1f} chunks/s, batch_size={self.batch_size}, "
+            f"workers={self.workers if parallel else 1})"
+        )
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
@@ -0,0 +1,213 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import logging
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+from response_cache import hash_key
+from storage import read_json, write_json
+import metrics
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+INGEST_CACHE_ENABLED = os.getenv('INGEST_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+INGEST_CACHE_DIR = os.getenv('INGEST_CACHE_DIR', './cache/ingest')
+INGEST_CACHE_MAX_MB = int(os.getenv('INGEST_CACHE_MAX_MB', '256'))
+# Seconds an entry stays fresh, per source type. A repository pinned to a
+# resolved commit cannot change, so it may live much longer than a page.
+INGEST_CACHE_TTLS = {
+    "github_repo": float(os.getenv('INGEST_CACHE_TTL_REPO', '604800')),
+    "url": float(os.getenv('INGEST_CACHE_TTL_URL', '3600')),
+    "topic": float(os.getenv('INGEST_CACHE_TTL_TOPIC', '1800')),
+}
+# Seconds allowed for `git ls-remote` when resolving a repository's commit
+GIT_LS_REMOTE_TIMEOUT = float(os.getenv('GIT_LS_REMOTE_TIMEOUT', '10'))
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that only track the visitor and never change the page
+_TRACKING_PARAMS = re.compile(r'^(utm_.*|fbclid|gclid|mc_cid|mc_eid|ref_src)$')
+
+
+def canonical_url(url: str) -> str:
+    """URL with scheme and host lower-cased, default port, fragment, trailing slash and tracking parameters removed"""
+    parts = urlsplit(url.strip() if "://" in url else "https://" + url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip('/') or '/'
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not _TRACKING_PARAMS.match(k)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def canonical_repo(url: str) -> str:
+    """``host/owner/repo`` plus any branch or sub-path, without scheme or ``.git``"""
+    parts = urlsplit(canonical_url(url))
+    segments = [segment for segment in parts.path.split('/') if segment]
+    if len(segments) >= 2:
+        segments[1] = re.sub(r'\.git$', '', segments[1])
+        segments[:2] = [segment.lower() for segment in segments[:2]]
+    return "/".join([parts.netloc] + segments)
+
+
+def parse_repo_url(github_url: str) -> Tuple[str, str, str, str]:
+    """(remote URL, owner/repo, ref, sub-path) of a repository URL; ref is HEAD unless the URL names one"""
+    segments = canonical_repo(github_url).split('/')
+    if len(segments) < 3:
+        raise ValueError(f"Not a repository URL: {github_url}")
+    ref, subpath = "HEAD", ""
+    if len(segments) >= 5 and segments[3] in ("tree", "blob", "commit"):
+        ref, subpath = segments[4], "/".join(segments[5:])
+    return f"https://{segments[0]}/{segments[1]}/{segments[2]}.git", f"{segments[1]}/{segments[2]}", ref, subpath
+
+
+def git_env() -> dict:
+    """Environment for git commands that never wait for credentials on a private or missing repository"""
+    return {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+
+
+def resolve_commit(github_url: str, timeout: float = GIT_LS_REMOTE_TIMEOUT) -> Optional[str]:
+    """Commit the repository URL currently points to, via ``git ls-remote``; None if it cannot be resolved.
+
+    ``/tree/<ref>`` and ``/commit/<sha>`` URLs resolve that ref; otherwise HEAD.
+    """
+    try:
+        remote, _, ref, _ = parse_repo_url(github_url)
+    except ValueError:
+        return None
+    if re.fullmatch(r'[0-9a-f]{40}', ref):
+        return ref
+    try:
+        completed = subprocess.run(
+            ["git", "ls-remote", remote, ref, f"{ref}^{{}}"], capture_output=True, text=True, timeout=timeout, env=git_env(),
+        )
+    except (OSError, subprocess.TimeoutExpired) as e:
+        logger.warning(f"Could not resolve the commit of {remote}: {str(e)}")
+        return None
+    shas = dict(reversed(line.split('\t', 1)) for line in completed.stdout.splitlines() if '\t' in line)
+    # An annotated tag is listed twice: the tag object, then the commit it
+    # points to as the peeled ``^{}`` line, which ls-remote only lists when
+    # asked for by that pattern. Only the commit can be fetched and
+    # checked out as the content, so it wins over the tag object.
+    for name in (ref, f"refs/heads/{ref}", f"refs/tags/{ref}^{{}}", f"refs/tags/{ref}"):
+        if name in shas:
+            return shas[name]
+    return None
+
+
+def _normalize_text(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def repo_key(github_url: str, commit: Optional[str]) -> str:
+    return hash_key("github_repo", canonical_repo(github_url), commit or "")
+
+
+def url_key(url: str) -> str:
+    return hash_key("url", canonical_url(url))
+
+
+def topic_key(instruction: str, topic: str) -> str:
+    return hash_key("topic", _normalize_text(instruction), _normalize_text(topic))
+
+
+class IngestCache:
+    """On-disk cache of fetched source documents with per-type TTLs and a size quota.
+
+    Each entry is a JSONL file of documents named by its key; ``index.json`` keeps the
+    entries in least-recently-used order with their type, size and creation
+    time. Expired entries are dropped on lookup, and the least recently used
+    ones are evicted once the files exceed ``max_mb``.
+    """
+
+    def __init__(self, directory: str = INGEST_CACHE_DIR, max_mb: int = INGEST_CACHE_MAX_MB, ttls: Optional[dict] = None):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.max_bytes = max_mb * 1024 * 1024
+        self.ttls = ttls or INGEST_CACHE_TTLS
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> {"type", "source", "bytes", "created", "ttl"}
+        self.entries.update(read_json(self.index_path, {}))
+        self.total_bytes = sum(entry["bytes"] for entry in self.entries.values())
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + '.jsonl')
+
+    def _drop(self, key: str):
+        entry = self.entries.pop(key)
+        self.total_bytes -= entry["bytes"]
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def copy_to(self, key: str, path: str) -> bool:
+        """Copy the cached documents for the key to path; False when missing or expired"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.time() - entry["created"] > entry["ttl"]:
+                self._drop(key)
+                self._save()
+                entry = None
+            if entry is None:
+                metrics.increment("ingest_cache.misses")
+                return False
+            try:
+                shutil.copyfile(self._path(key), path)
+            except OSError:
+                self._drop(key)
+                self._save()
+                metrics.increment("ingest_cache.misses")
+                return False
+            self.entries.move_to_end(key)
+            self._save()
+        metrics.increment("ingest_cache.hits")
+        logger.info(f"Ingest cache hit for {entry['source']}")
+        return True
+
+    def put(self, key: str, source_type: str, source: str, path: str, ttl: Optional[float] = None):
+        """Store a copy of a JSONL file of fetched documents; ``ttl`` overrides the source type's TTL"""
+        size = os.path.getsize(path)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp_path = self._path(key) + '.tmp'
+                shutil.copyfile(path, tmp_path)
+                os.replace(tmp_path, self._path(key))
+            except OSError as e:
+                logger.warning(f"Could not write ingest cache entry for {source}: {str(e)}")
+                return
+            if key in self.entries:
+                self.total_bytes -= self.entries[key]["bytes"]
+            self.entries[key] = {
+                "type": source_type,
+                "source": source,
+                "bytes": size,
+                "created": time.time(),
+                "ttl": self.ttls.get(source_type, 0) if ttl is None else ttl,
+            }
+            self.entries.move_to_end(key)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                evicted = next(iter(self.entries))
+                self._drop(evicted)
+                metrics.increment("ingest_cache.evictions")
+            self._save()
+
+    def _save(self):
+        try:
+            write_json(self.index_path, self.entries)
+        except OSError as e:
+            logger.warning(f"Could not write ingest cache index {self.index_path}: {str(e)}")
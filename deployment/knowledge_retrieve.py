@@ -1,27 +1,28 @@
-from langchain_groq import ChatGroq
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
+from langchain_core.runnables import RunnableConfig, RunnableLambda
 from typing import Literal, TypedDict, List
 from typing_extensions import Annotated
 from langgraph.graph import START, StateGraph
-from langchain_core.vectorstores import InMemoryVectorStore
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import glob
+import threading
 import json
 import os
 import logging
 import time
 
-
-from dotenv import load_dotenv
-import os
-
-# Load .env file
-load_dotenv()
-
-# Use os.getenv() to avoid KeyError
-GROQ_API_KEY= os.getenv('GROQ_API_KEY')
+from model_registry import get_embeddings, get_llm
+from embedding_cache import CachedEmbeddings, with_embedding_cache
+from embedding_executor import EMBED_PARALLEL_MIN_CHUNKS, EMBED_WORKERS, BatchedEmbeddings
+from keyword_index import get_search_index, reciprocal_rank_fusion
+from chunking import get_text_splitter, iter_file_chunks, iter_jsonl_chunks, split_document
+from data_manifest import DataManifest
+from query_analysis import QUERY_ANALYSIS_MODE, heuristic_analysis, normalize_question
+from response_cache import PersistentLRUCache, hash_key
+from context_packer import pack_context
+import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -31,7 +32,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Chunks embedded and written to the index at a time while streaming a file
+STREAM_BUFFER_CHUNKS = int(os.getenv('STREAM_BUFFER_CHUNKS', '256'))
+# Each buffer is one embed_documents call, so a smaller buffer than the parallel threshold never uses the workers
+if EMBED_WORKERS > 1 and STREAM_BUFFER_CHUNKS < EMBED_PARALLEL_MIN_CHUNKS:
+    logger.warning(
+        f"STREAM_BUFFER_CHUNKS={STREAM_BUFFER_CHUNKS} is below EMBED_PARALLEL_MIN_CHUNKS={EMBED_PARALLEL_MIN_CHUNKS}: "
+        f"the {EMBED_WORKERS} embedding workers will not be used"
+    )
+# Small fixed pool for CPU-bound work (indexing, query embedding, sub-query searches)
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv('RAG_CPU_WORKERS', '4')), thread_name_prefix='rag-cpu')
+# Indexing ./data is not safe to run from two pipelines at once
+_index_update_lock = threading.Lock()
+
+# Chunks retrieved per (sub-)query
+RAG_TOP_K = int(os.getenv('RAG_TOP_K', '4'))
+# Sub-queries retrieved in addition to the main query
+MAX_SUB_QUERIES = int(os.getenv('MAX_SUB_QUERIES', '3'))
+# Chunks kept after fusing the results of all queries; the context packer trims further
+MULTI_QUERY_TOP_K = int(os.getenv('MULTI_QUERY_TOP_K', '8'))
+# "similarity" or "mmr" (diverse results, see MMR_FETCH_K / MMR_LAMBDA); run() can override it per query
+RAG_SEARCH_TYPE = os.getenv('RAG_SEARCH_TYPE', 'similarity').lower()
+
+# Structured query analysis results, keyed by model and normalized question
+ANALYSIS_CACHE_ENABLED = os.getenv('ANALYSIS_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+analysis_cache = PersistentLRUCache(
+    os.getenv('ANALYSIS_CACHE_PATH', './cache/analysis_cache.json'),
+    max_entries=int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '1000'))
+) if ANALYSIS_CACHE_ENABLED else None
+
+# Generated answers, keyed by model, prompt template, question and retrieved context
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+answer_cache = PersistentLRUCache(
+    os.getenv('ANSWER_CACHE_PATH', './cache/answer_cache.json'),
+    max_entries=int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '500')),
+    ttl=float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+) if ANSWER_CACHE_ENABLED else None
+
 # Define global TypedDicts
+class SubQuery(TypedDict):
+    """Search query for one part of the question."""
+    query: Annotated[str, ..., "Search query to run."]
+    section: Annotated[
+        Literal["beginning", "middle", "end"],
+        ...,
+        "Section to query.",
+    ]
+
 class Search(TypedDict):
     """Search query."""
     query: Annotated[str, ..., "Search query to run."]
@@ -40,6 +87,11 @@ class Search(TypedDict):
         ...,
         "Section to query.",
     ]
+    sub_queries: Annotated[
+        List[SubQuery],
+        [],
+        "Separate searches for distinct parts of the question, empty if it has only one part.",
+    ]
 
 class State(TypedDict):
     question: str
@@ -49,21 +101,19 @@ class State(TypedDict):
     input_type: str  # Added to track the type of input
     input_url: str   # Added to track the source URL
 
-# Define the RAG pipeline as a class to prevent caching issues
+# Define the RAG pipeline as a class to prevent caching issues.
+# Documents, vector store and graph are per instance; the LLM client and
+# embedding model come from the process-wide registry and are loaded once.
 class RAGPipeline:
     def __init__(self):
         logger.info("Initializing new RAG Pipeline instance")
         
-        # Initialize LLM
-        self.llm = ChatGroq(
-            model='llama3-70b-8192',
-            temperature=0.7,
-            max_tokens=1024,
-            api_key=GROQ_API_KEY
-        )
+        # Shared LLM client
+        self.llm = get_llm(temperature=0.7, max_tokens=1024)
 
-        # Initialize embeddings
-        self.embeddings = HuggingFaceEmbeddings(model_name='sentence-transformers/all-mpnet-base-v2')
+        # Shared embedding model; chunk vectors are served from the on-disk cache when possible
+        # and cache misses are embedded in length-sorted batches, optionally across worker processes
+        self.embeddings = with_embedding_cache(BatchedEmbeddings(get_embeddings()))
         
         # Create necessary directories
         os.makedirs('./data', exist_ok=True)
@@ -87,137 +137,323 @@ class RAGPipeline:
 """
         self.prompt = PromptTemplate.from_template(self.template)
         self.vector_store = None
-        self.all_splits = []
+        # Per-node timings and LLM usage of the most recent run
+        self.last_report = None
+        self.indexed_chunks = 0
         self.graph = None
         
         # Load and prepare documents
-        self._prepare_documents()
+        with _index_update_lock:
+            self._prepare_documents()
         self._build_graph()
 
     def _prepare_documents(self):
-        """Load and prepare documents from the data directory"""
+        """Index new or changed documents from the data directory, streaming them in bounded batches"""
+        # Open the persistent index; sources indexed by earlier runs are reused
+        self.vector_store = get_search_index()
+        indexed_sources = self.vector_store.sources()
+
         try:
             # Check if data directory has any txt files
             if not os.path.exists('./data'):
                 os.makedirs('./data', exist_ok=True)
-                
-            txt_files_exist = any(
-                file.endswith('.txt') 
-                for file in os.listdir('./data') 
-                if os.path.isfile(os.path.join('./data', file))
+
+            # Ingestion writes JSONL document streams; plain .txt files are indexed as they are
+            paths = sorted(
+                glob.glob(os.path.join('./data', '**', '*.txt'), recursive=True)
+                + glob.glob(os.path.join('./data', '**', '*.jsonl'), recursive=True)
             )
-            
-            if not txt_files_exist:
-                logger.warning("No .txt files found in ./data directory. Creating a sample document.")
+
+            if not paths:
+                logger.warning("No .txt or .jsonl files found in ./data directory. Creating a sample document.")
                 with open('./data/sample_document.txt', 'w', encoding='utf-8') as f:
                     f.write("This is a sample document created automatically because no documents were found.\n")
                     f.write("You can replace this with your actual content or add more documents to the data directory.")
-            
-            loader = DirectoryLoader(
-                path='./data',
-                glob='**/*.txt',
-                loader_cls=TextLoader,
-                loader_kwargs={'encoding': 'utf-8'}
-            )
-            docs = loader.load()
-            logger.info(f"Loaded {len(docs)} documents from ./data directory")
-            
+                paths = [os.path.join('./data', 'sample_document.txt')]
+            logger.info(f"Found {len(paths)} documents in ./data directory")
+
+            # Only files that are new or modified since the last run are read and re-indexed
+            manifest = DataManifest()
+            changes = manifest.diff(paths, indexed_sources)
+
+            # Drop sources that are no longer in ./data
+            for source in changes.deleted:
+                self.vector_store.delete_source(source)
+                manifest.remove(source)
+
+            text_splitter = get_text_splitter()
+            for path, fingerprint, total_chars in changes.changed:
+                self.vector_store.delete_source(path)
+                # Chunks carry their section metadata from chunking time and are stored with the vectors
+                if path.endswith('.jsonl'):
+                    chunks = iter_jsonl_chunks(path, text_splitter=text_splitter)
+                else:
+                    chunks = iter_file_chunks(path, total_chars, text_splitter=text_splitter)
+                self._index_chunks(path, chunks)
+                self.vector_store.set_fingerprint(path, fingerprint)
+                manifest.record(path, fingerprint, total_chars)
+                manifest.save()
+            manifest.save()
+
         except Exception as e:
             logger.error(f"Error loading documents: {str(e)}")
-            # Create a default document when loading fails
-            docs = [Document(
-                page_content="This is a default document created when document loading failed.",
-                metadata={"source": "default"}
-            )]
-            logger.info("Created a default document due to loading failure")
-
-        # Split documents
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            add_start_index=True
-        )
-        self.all_splits = text_splitter.split_documents(docs)
-        logger.info(f"Split documents into {len(self.all_splits)} chunks")
+            if not self.vector_store.sources():
+                # Create a default document when loading fails
+                doc = Document(
+                    page_content="This is a default document created when document loading failed.",
+                    metadata={"source": "default"}
+                )
+                self.vector_store.add_documents(
+                    "default", "default", split_document(doc),
+                    self.embeddings.embed_documents([doc.page_content])
+                )
+                logger.info("Created a default document due to loading failure")
 
-        # Create vector store
-        self.vector_store = InMemoryVectorStore(self.embeddings)
+        # The embedding cache index is written once per ingest rather than per batch
+        if isinstance(self.embeddings, CachedEmbeddings):
+            self.embeddings.flush()
+        logger.info(f'Indexing completed successfully, {self.indexed_chunks} new chunks')
 
-        # Add documents to vector store
-        _ = self.vector_store.add_documents(self.all_splits)
-        logger.info('Indexing completed successfully')
-        
-        # Add section metadata to documents
-        total_documents = len(self.all_splits)
-        if total_documents > 0:
-            third = max(1, total_documents // 3)
-            
-            for i, document in enumerate(self.all_splits):
-                if i < third:
-                    document.metadata["section"] = "beginning"
-                elif i < 2 * third:
-                    document.metadata["section"] = "middle"
-                else:
-                    document.metadata["section"] = "end"
-            logger.info("Added section metadata to documents")
+    def _index_chunks(self, source, chunks):
+        """Embed and store a stream of chunks, holding at most STREAM_BUFFER_CHUNKS in memory"""
+        batch = []
+        for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= STREAM_BUFFER_CHUNKS:
+                self._flush_batch(source, batch)
+                batch = []
+        if batch:
+            self._flush_batch(source, batch)
 
-    def analyze_query(self, state: State):
-        """Analyze and structure the query for better retrieval"""
-        logger.info(f"Analyzing query: {state['question']}")
-        
+    def _flush_batch(self, source, batch):
+        vectors = self.embeddings.embed_documents([chunk.page_content for chunk in batch])
+        self.vector_store.append_documents(source, batch, vectors)
+        self.indexed_chunks += len(batch)
+
+    def _cached_analysis(self, question):
+        """Return (cache key, analysis) where analysis comes from the cache or the heuristic, or is None"""
+        # Versioned so single-query analyses cached before sub-queries existed are not reused
+        cache_key = hash_key(self.llm.model_name, "sub_queries", normalize_question(question))
+        if analysis_cache is not None:
+            cached = analysis_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Query analysis cache hit: {cached}")
+                return cache_key, cached
+
+        # Simple instructions can skip the LLM round trip entirely
+        if QUERY_ANALYSIS_MODE in ("auto", "heuristic"):
+            result = heuristic_analysis(question, force=QUERY_ANALYSIS_MODE == "heuristic")
+            if result is not None:
+                logger.info(f"Heuristic query analysis result: {result}")
+                return cache_key, result
+        return cache_key, None
+
+    def _analysis_prompt(self, question):
         # Enhance the prompt with additional instructions for decomposition and validation.
-        enhanced_instructions = (
+        return (
             "You are an expert query analyzer. Decompose the following question into its core components. "
             "Extract the main query and, if present, any sub-questions that might require separate handling. "
             "Also determine the document section to search over: 'beginning', 'middle', or 'end'. "
-            "Return the result as a JSON with keys 'query' and 'section'.\n"
-            "Question: " + state["question"]
+            f"List at most {MAX_SUB_QUERIES} sub-questions as separate search queries, each with its own section. "
+            "Return the result as a JSON with keys 'query', 'section' and 'sub_queries'.\n"
+            "Question: " + question
         )
-        
-        structured_llm = self.llm.with_structured_output(Search)
-        result = structured_llm.invoke(enhanced_instructions)
+
+    def _store_analysis(self, cache_key, result):
         logger.info(f"Analyzed query result: {result}")
+        if analysis_cache is not None:
+            analysis_cache.put(cache_key, dict(result))
         return {"query": result}
 
-    def retrieve(self, state: State):
+    def analyze_query(self, state: State):
+        """Analyze and structure the query for better retrieval"""
+        logger.info(f"Analyzing query: {state['question']}")
+        cache_key, result = self._cached_analysis(state["question"])
+        if result is not None:
+            return {"query": result}
+
+        structured_llm = self.llm.with_structured_output(Search)
+        result = structured_llm.invoke(self._analysis_prompt(state["question"]))
+        return self._store_analysis(cache_key, result)
+
+    async def aanalyze_query(self, state: State):
+        """Async analyze_query; the LLM call does not hold a thread"""
+        logger.info(f"Analyzing query: {state['question']}")
+        cache_key, result = self._cached_analysis(state["question"])
+        if result is not None:
+            return {"query": result}
+
+        structured_llm = self.llm.with_structured_output(Search)
+        result = await structured_llm.ainvoke(self._analysis_prompt(state["question"]))
+        # The cache write is file I/O, so it runs on the executor
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(CPU_EXECUTOR, self._store_analysis, cache_key, result)
+
+    def _search(self, query):
+        # Dense and keyword (BM25) results are fused when hybrid search is enabled
+        return self.vector_store.search(
+            query["query"],
+            self.embeddings.embed_query(query["query"]),
+            k=RAG_TOP_K,
+            filter={"section": query["section"]},
+            search_type=query["search_type"],
+        )
+
+    def _queries(self, analysis, config):
+        """Main query followed by its distinct sub-queries, each with the run's search type"""
+        logger.info(f"Retrieving documents for query: {analysis['query']}, section: {analysis['section']}")
+        search_type = (config or {}).get("configurable", {}).get("search_type") or RAG_SEARCH_TYPE
+        queries, seen = [], set()
+        for query in [analysis] + list(analysis.get("sub_queries") or [])[:MAX_SUB_QUERIES]:
+            key = (normalize_question(query["query"]), query["section"])
+            if query["query"].strip() and key not in seen:
+                seen.add(key)
+                queries.append({"query": query["query"], "section": query["section"], "search_type": search_type})
+        return queries
+
+    def _merge(self, results):
+        """Fuse per-query rankings with reciprocal rank fusion, keeping each chunk once"""
+        if len(results) == 1:
+            return results[0]
+        by_id, rankings = {}, []
+        for docs in results:
+            ranking = []
+            for doc in docs:
+                chunk_id = doc.metadata.get("chunk_id") or hash_key(doc.page_content)
+                by_id.setdefault(chunk_id, doc)
+                ranking.append(chunk_id)
+            rankings.append(ranking)
+        fused = reciprocal_rank_fusion(rankings)[:MULTI_QUERY_TOP_K]
+        logger.info(f"Fused {sum(len(docs) for docs in results)} results of {len(results)} queries into {len(fused)} chunks")
+        return [by_id[chunk_id] for chunk_id, _ in fused]
+
+    def _retrieved(self, queries, results):
+        retrieved_docs = self._merge(results)
+        logger.info(f"Retrieved {len(retrieved_docs)} documents for {len(queries)} queries")
+        return {"context": retrieved_docs}
+
+    def _retrieval_failed(self, e):
+        logger.error(f"Error during document retrieval: {str(e)}")
+        metrics.node_error(e)
+        # Return empty context if retrieval fails
+        return {"context": []}
+
+    def retrieve(self, state: State, config: RunnableConfig = None):
         """Retrieve relevant documents based on query"""
-        logger.info(f"Retrieving documents for query: {state['query']['query']}, section: {state['query']['section']}")
-        
         try:
-            query = state["query"]
-            retrieved_docs = self.vector_store.similarity_search(
-                query["query"],
-                filter=lambda doc: doc.metadata.get("section") == query["section"],
-            )
-            logger.info(f"Retrieved {len(retrieved_docs)} documents")
-            return {"context": retrieved_docs}
+            # Sub-queries are searched concurrently so they add no serial latency
+            queries = self._queries(state["query"], config)
+            return self._retrieved(queries, list(CPU_EXECUTOR.map(self._search, queries)))
         except Exception as e:
-            logger.error(f"Error during document retrieval: {str(e)}")
-            # Return empty context if retrieval fails
-            return {"context": []}
+            return self._retrieval_failed(e)
 
-    def generate(self, state: State):
-        """Generate answer based on retrieved context"""
+    async def aretrieve(self, state: State, config: RunnableConfig = None):
+        """Async retrieve; query embedding and search run on the CPU executor"""
+        try:
+            loop = asyncio.get_running_loop()
+            queries = self._queries(state["query"], config)
+            return self._retrieved(queries, await asyncio.gather(*(
+                loop.run_in_executor(CPU_EXECUTOR, self._search, query) for query in queries
+            )))
+        except Exception as e:
+            return self._retrieval_failed(e)
+
+    def _answer_cache_key(self, state: State):
+        # Chunk ids plus content, so a re-ingested source with the same ids is a miss
+        context_fingerprint = hash_key(*(
+            f"{doc.metadata.get('chunk_id', '')}:{hash_key(doc.page_content)}" for doc in state["context"]
+        ))
+        return hash_key(self.llm.model_name, self.template, state["question"], context_fingerprint)
+
+    def _cached_answer(self, cache_key):
+        answer = answer_cache.get(cache_key) if answer_cache is not None else None
+        if answer is not None:
+            metrics.increment("answer_cache.hit")
+            logger.info("Answer cache hit, skipping the LLM call")
+        else:
+            metrics.increment("answer_cache.miss")
+        return answer
+
+    def _answer_messages(self, state: State):
+        # Overlapping neighbours are merged and the context is cut to the token budget
+        # Passages from ingested documents are labelled with their title and URL
+        docs_content = "\n\n".join(
+            f"[{doc.metadata.get('title') or doc.metadata['url']}]({doc.metadata['url']})\n{doc.page_content}"
+            if doc.metadata.get("url") else doc.page_content
+            for doc in pack_context(state["context"])
+        )
+        return self.prompt.invoke({"question": state["question"], "context": docs_content})
+
+    def _store_answer(self, cache_key, answer):
+        if answer_cache is not None:
+            answer_cache.put(cache_key, answer)
+        logger.info("Answer generated successfully")
+
+    def _on_token(self, config):
+        """The run's on_token(stage, text_so_far) streaming callback, if any"""
+        return (config or {}).get("configurable", {}).get("on_token")
+
+    def _prepared_answer(self, state: State, on_token):
+        """Return (cache key, answer) where answer is the default or cached one, or None when the LLM must answer"""
         logger.info("Generating answer based on retrieved context")
-        
+        if not state["context"]:
+            logger.warning("No context available, returning default answer")
+            return None, "I couldn't find relevant information to answer your question based on the available documents."
+        cache_key = self._answer_cache_key(state)
+        answer = self._cached_answer(cache_key)
+        if answer is not None and on_token is not None:
+            on_token("Answering", answer)
+        return cache_key, answer
+
+    def _generation_failed(self, e):
+        logger.error(f"Error generating answer: {str(e)}")
+        metrics.node_error(e)
+        return "An error occurred while generating the answer. Please try again."
+
+    def generate(self, state: State, config: RunnableConfig = None):
+        """Generate answer based on retrieved context"""
+        on_token = self._on_token(config)
+        try:
+            cache_key, answer = self._prepared_answer(state, on_token)
+            if answer is None and on_token is not None:
+                answer = ""
+                for chunk in self.llm.stream(self._answer_messages(state)):
+                    answer += chunk.content
+                    on_token("Answering", answer)
+                self._store_answer(cache_key, answer)
+            elif answer is None:
+                answer = self.llm.invoke(self._answer_messages(state)).content
+                self._store_answer(cache_key, answer)
+        except Exception as e:
+            answer = self._generation_failed(e)
+        return self._save_result(state, answer)
+
+    async def agenerate(self, state: State, config: RunnableConfig = None):
+        """Async generate; the LLM call does not hold a thread"""
+        on_token = self._on_token(config)
+        # Cache and result writes are file I/O, so they run on the executor
+        loop = asyncio.get_running_loop()
+        try:
+            cache_key, answer = self._prepared_answer(state, on_token)
+            if answer is None and on_token is not None:
+                answer = ""
+                async for chunk in self.llm.astream(self._answer_messages(state)):
+                    answer += chunk.content
+                    on_token("Answering", answer)
+                await loop.run_in_executor(CPU_EXECUTOR, self._store_answer, cache_key, answer)
+            elif answer is None:
+                answer = (await self.llm.ainvoke(self._answer_messages(state))).content
+                await loop.run_in_executor(CPU_EXECUTOR, self._store_answer, cache_key, answer)
+        except Exception as e:
+            answer = self._generation_failed(e)
+        return await loop.run_in_executor(CPU_EXECUTOR, self._save_result, state, answer)
+
+    def _save_result(self, state: State, answer: str):
+        """Write the answer and its context to output/result.json for post generation"""
         # Get input type and URL from query.json if available
         input_type = state.get("input_type", "")
         input_url = state.get("input_url", "")
-        
-        try:
-            if state["context"]:
-                docs_content = "\n\n".join(doc.page_content for doc in state["context"])
-                messages = self.prompt.invoke({"question": state["question"], "context": docs_content})
-                response = self.llm.invoke(messages)
-                answer = response.content
-                logger.info("Answer generated successfully")
-            else:
-                answer = "I couldn't find relevant information to answer your question based on the available documents."
-                logger.warning("No context available, returning default answer")
-        except Exception as e:
-            logger.error(f"Error generating answer: {str(e)}")
-            answer = "An error occurred while generating the answer. Please try again."
-        
+
         # Try to load input_type and input_url from query.json
         try:
             with open('./query/query.json', 'r', encoding='utf-8') as file:
@@ -233,6 +469,10 @@ class RAGPipeline:
         result_data = {
             "query": state["question"],
             "retrieved_context": [doc.page_content for doc in state["context"]] if state["context"] else [],
+            "sources": list({
+                doc.metadata["url"]: {"url": doc.metadata["url"], "title": doc.metadata.get("title", "")}
+                for doc in state["context"] or [] if doc.metadata.get("url")
+            }.values()),
             "answer": answer,
             "input_type": input_type,
             "input_url": input_url,
@@ -260,10 +500,14 @@ class RAGPipeline:
         """Build and compile the graph for the RAG pipeline"""
         graph_builder = StateGraph(State)
         
-        # Add nodes
-        graph_builder.add_node("analyze_query", self.analyze_query)
-        graph_builder.add_node("retrieve", self.retrieve)
-        graph_builder.add_node("generate", self.generate)
+        # Add nodes; each has a sync and an async implementation so the graph
+        # can be driven by stream() or astream(). Both are instrumented for the run report.
+        for name, func, afunc in (
+            ("analyze_query", self.analyze_query, self.aanalyze_query),
+            ("retrieve", self.retrieve, self.aretrieve),
+            ("generate", self.generate, self.agenerate),
+        ):
+            graph_builder.add_node(name, RunnableLambda(metrics.instrument("rag", name, func), afunc=metrics.ainstrument("rag", name, afunc)))
         
         # Add edges
         graph_builder.add_edge("analyze_query", "retrieve")
@@ -274,10 +518,8 @@ class RAGPipeline:
         self.graph = graph_builder.compile()
         logger.info("Graph compiled successfully")
 
-    def run(self, query=None, input_type="", input_url=""):
-        """Run the RAG pipeline with the given query or from query.json"""
-        logger.info("Starting RAG pipeline execution")
-        
+    def _resolve_query(self, query, input_type, input_url):
+        """Load the query from query.json when none is given, otherwise save it there"""
         # If query is not provided, load from query.json
         if query is None:
             try:
@@ -307,38 +549,104 @@ class RAGPipeline:
                     "timestamp": time.time()  # Add timestamp to prevent caching
                 }, file, indent=4)
             logger.info(f"Saved new query to query.json: {query}")
+        return {"question": query, "input_type": input_type, "input_url": input_url}
+
+    def run(self, query=None, input_type="", input_url="", on_token=None, search_type=None):
+        """Run the RAG pipeline with the given query or from query.json.
+
+        on_token(stage, text_so_far) receives the answer while it is generated.
+        search_type ("similarity" or "mmr") overrides RAG_SEARCH_TYPE for this query.
+        """
+        logger.info("Starting RAG pipeline execution")
+        inputs = self._resolve_query(query, input_type, input_url)
 
         # Stream the graph using the loaded query
-        try:
-            logger.info("Streaming graph execution")
-            final_state = None
-            for step in self.graph.stream(
-                {
-                    "question": query,
-                    "input_type": input_type,
-                    "input_url": input_url
-                },
-                stream_mode="updates",
-            ):
-                current_node = list(step.keys())[0] if step else "unknown"
-                logger.info(f"Completed node: {current_node}")
-                print(f"{step}\n\n----------------\n")
-                final_state = step
-                
+        with GraphRun(self, on_token, search_type) as run:
+            for step in self.graph.stream(inputs, config=run.config, stream_mode="updates"):
+                run.step(step)
+        return run.answer
+
+    async def arun(self, query=None, input_type="", input_url="", on_token=None, search_type=None):
+        """Async run: LLM nodes await Groq directly, CPU work goes to the CPU executor"""
+        logger.info("Starting async RAG pipeline execution")
+        loop = asyncio.get_running_loop()
+        inputs = await loop.run_in_executor(CPU_EXECUTOR, self._resolve_query, query, input_type, input_url)
+
+        async with GraphRun(self, on_token, search_type) as run:
+            async for step in self.graph.astream(inputs, config=run.config, stream_mode="updates"):
+                run.step(step)
+        return run.answer
+
+
+class GraphRun:
+    """One streamed execution of the RAG graph, shared by run and arun.
+
+    Collects the final step's answer, turns an exception into an error
+    answer, and stores the run report on the pipeline when the block exits.
+    ``async with`` writes the report on the CPU executor instead of the
+    event loop.
+    """
+
+    def __init__(self, pipeline: RAGPipeline, on_token=None, search_type=None):
+        self.pipeline = pipeline
+        self.report = metrics.RunReport("rag")
+        self.config = metrics.run_config(self.report, {"on_token": on_token, "search_type": search_type})
+        self.final_state = None
+        self.answer = None
+
+    def __enter__(self):
+        logger.info("Streaming graph execution")
+        return self
+
+    def step(self, step):
+        current_node = list(step.keys())[0] if step else "unknown"
+        logger.info(f"Completed node: {current_node}")
+        print(f"{step}\n\n----------------\n")
+        self.final_state = step
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.pipeline.last_report = self.report.finish()
+        return self._close(exc_type, exc)
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        loop = asyncio.get_running_loop()
+        self.pipeline.last_report = await loop.run_in_executor(CPU_EXECUTOR, self.report.finish)
+        return self._close(exc_type, exc)
+
+    def _close(self, exc_type, exc):
+        if exc_type is None:
             logger.info("RAG pipeline completed successfully")
-            return final_state.get("generate", {}).get("answer", "No answer generated") if final_state else "Pipeline completed but no result was produced"
-        except Exception as e:
-            logger.error(f"Error in graph execution: {str(e)}")
-            print(f"Error: {str(e)}")
-            return f"Error: {str(e)}"
+            self.answer = (
+                self.final_state.get("generate", {}).get("answer", "No answer generated")
+                if self.final_state else "Pipeline completed but no result was produced"
+            )
+            return False
+        if not issubclass(exc_type, Exception):
+            return False
+        logger.error(f"Error in graph execution: {str(exc)}")
+        print(f"Error: {str(exc)}")
+        self.answer = f"Error: {str(exc)}"
+        # Callers show the error text as the answer instead of handling an exception
+        return True
 
 # Create a function to run RAG that can be imported by other modules
-def run_rag(query=None, input_type="", input_url=""):
+def run_rag(query=None, input_type="", input_url="", on_token=None, search_type=None):
     """Run the RAG pipeline with the given query or from query.json"""
-    # Create a new pipeline instance for each query to prevent caching issues
+    # Create a new pipeline instance for each query to prevent caching issues;
+    # the heavy models behind it are reused from model_registry
     pipeline = RAGPipeline()
-    return pipeline.run(query, input_type, input_url)
+    return pipeline.run(query, input_type, input_url, on_token=on_token, search_type=search_type)
+
+async def arun_rag(query=None, input_type="", input_url="", on_token=None, search_type=None):
+    """Async run_rag for event-loop callers such as the Telegram bot"""
+    # Indexing and embedding are CPU-bound, so the pipeline is built on the executor
+    loop = asyncio.get_running_loop()
+    pipeline = await loop.run_in_executor(CPU_EXECUTOR, RAGPipeline)
+    return await pipeline.arun(query, input_type, input_url, on_token=on_token, search_type=search_type)
 
 # Run the script if it's the main module
 if __name__ == "__main__":
-    run_rag()
+    run_rag()
\ No newline at end of file
@@ -28,8 +28,8 @@ def main():
     print("Collecting data using knowledge_base.py...")
     run_script("knowledge_base.py")
     
-    # Wait until a .txt file is available in the data directory
-    wait_for_data(data_dir, ".txt", timeout=10)
+    # Wait until the ingested documents are available in the data directory
+    wait_for_data(data_dir, ".jsonl", timeout=10)
 
     # Step 2: Run RAG process (knowledge_retrieve.py)Summarize
     print("Running RAG process using knowledge_retrieve.py...")
@@ -0,0 +1,300 @@
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.runnables.utils import accepts_config
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from storage import write_json
+
+from dotenv import load_dotenv
+
+# Load .env file
+load_dotenv()
+
+# One JSON line per graph run with its per-node breakdown
+RUN_REPORT_PATH = os.getenv('RUN_REPORT_PATH', './output/run_reports.jsonl')
+# Counters and cumulative histograms, rewritten after every run
+METRICS_PATH = os.getenv('METRICS_PATH', './output/metrics.json')
+
+logger = logging.getLogger(__name__)
+
+# Histogram upper bounds; values above the last bound fall in an overflow bucket
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+TOKEN_BUCKETS = (50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+# Process-wide counters, e.g. cache hits and misses
+_counters = Counter()
+_histograms = {}
+_lock = threading.Lock()
+
+
+def increment(name: str, value: int = 1) -> None:
+    with _lock:
+        _counters[name] += value
+
+
+def get_counters() -> dict:
+    """Snapshot of every counter"""
+    with _lock:
+        return dict(_counters)
+
+
+class Histogram:
+    """Cumulative fixed-bucket histogram"""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th quantile (the max for the overflow bucket)"""
+        if not self.count:
+            return None
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= q * self.count:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "buckets": {
+                **{f"le_{bound}": count for bound, count in zip(self.bounds, self.buckets)},
+                "overflow": self.buckets[-1],
+            },
+        }
+
+
+def observe(name: str, value: float, bounds=LATENCY_BUCKETS_MS) -> None:
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram(bounds)
+        histogram.observe(value)
+
+
+def get_histograms() -> Dict[str, dict]:
+    """Snapshot of every histogram"""
+    with _lock:
+        return {name: histogram.to_dict() for name, histogram in _histograms.items()}
+
+
+def save_snapshot(path: str = METRICS_PATH):
+    """Write counters and histograms to a JSON file"""
+    try:
+        write_json(path, {"counters": get_counters(), "histograms": get_histograms()}, indent=4)
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {path}: {str(e)}")
+
+
+class NodeStats:
+    """Measurements for one execution of a graph node"""
+
+    def __init__(self, graph: str, node: str):
+        self.graph = graph
+        self.node = node
+        self.wall_ms = 0.0
+        self.llm_calls = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.retries = 0
+        self.errors = []
+
+    def to_dict(self) -> dict:
+        return {
+            "node": self.node,
+            "wall_ms": round(self.wall_ms, 1),
+            "llm_calls": self.llm_calls,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "retries": self.retries,
+            "errors": self.errors,
+        }
+
+
+class RunReport:
+    """Per-run report of every node execution, in order"""
+
+    def __init__(self, graph: str):
+        self.graph = graph
+        self.run_id = uuid.uuid4().hex
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.wall_ms = None
+        self.nodes = []
+        self.lock = threading.Lock()
+
+    def add(self, stats: NodeStats):
+        with self.lock:
+            self.nodes.append(stats)
+
+    def to_dict(self) -> dict:
+        nodes = [stats.to_dict() for stats in self.nodes]
+        totals = {key: sum(node[key] for node in nodes) for key in ("llm_calls", "tokens_in", "tokens_out", "retries")}
+        totals["errors"] = sum(len(node["errors"]) for node in nodes)
+        return {
+            "run_id": self.run_id,
+            "graph": self.graph,
+            "started": self.started,
+            "wall_ms": self.wall_ms,
+            "totals": totals,
+            "nodes": nodes,
+        }
+
+    def finish(self, path: str = RUN_REPORT_PATH) -> dict:
+        """Close the run, log a one-line summary and append the report to the JSONL file"""
+        self.wall_ms = round((time.perf_counter() - self.start) * 1000, 1)
+        observe(f"{self.graph}.run.wall_ms", self.wall_ms)
+        report = self.to_dict()
+        summary = ", ".join(f"{node['node']} {node['wall_ms']:.0f}ms" for node in report["nodes"])
+        logger.info(f"{self.graph} run {self.run_id[:8]} took {self.wall_ms:.0f}ms ({summary}), totals {report['totals']}")
+        try:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(report) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write run report to {path}: {str(e)}")
+        save_snapshot()
+        return report
+
+
+# Node currently executing in this thread or task; LLM callbacks attribute usage to it
+_current_node: ContextVar[Optional[NodeStats]] = ContextVar("current_node", default=None)
+
+
+def node_error(error: BaseException) -> None:
+    """Record an error a node handled itself instead of raising"""
+    stats = _current_node.get()
+    message = f"{type(error).__name__}: {error}"
+    # A failed LLM call is reported by the callback and again if the node re-raises it
+    if stats is not None and (not stats.errors or stats.errors[-1] != message):
+        stats.errors.append(message)
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Adds LLM calls, token usage, retries and LLM errors to the running node"""
+
+    # Called in the node's own context so _current_node is visible
+    run_inline = True
+
+    def on_llm_end(self, response, **kwargs):
+        stats = _current_node.get()
+        if stats is None:
+            return
+        stats.llm_calls += 1
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if getattr(message, "usage_metadata", None):
+                    usage = message.usage_metadata
+        if usage:
+            stats.tokens_in += usage.get("input_tokens", 0)
+            stats.tokens_out += usage.get("output_tokens", 0)
+        else:
+            # Providers that only report usage in llm_output
+            token_usage = (response.llm_output or {}).get("token_usage") or {}
+            stats.tokens_in += token_usage.get("prompt_tokens", 0)
+            stats.tokens_out += token_usage.get("completion_tokens", 0)
+
+    def on_llm_error(self, error, **kwargs):
+        node_error(error)
+
+    def on_retry(self, retry_state, **kwargs):
+        stats = _current_node.get()
+        if stats is not None:
+            stats.retries += 1
+
+
+def run_config(report: RunReport, configurable: Optional[dict] = None) -> dict:
+    """Graph config carrying the run report and the usage callback"""
+    return {
+        "configurable": {**(configurable or {}), "run_report": report},
+        "callbacks": [UsageCallbackHandler()],
+    }
+
+
+def _record(stats: NodeStats, config, start: float):
+    stats.wall_ms = (time.perf_counter() - start) * 1000
+    prefix = f"{stats.graph}.{stats.node}"
+    observe(f"{prefix}.wall_ms", stats.wall_ms)
+    if stats.llm_calls:
+        observe(f"{prefix}.tokens_in", stats.tokens_in, TOKEN_BUCKETS)
+        observe(f"{prefix}.tokens_out", stats.tokens_out, TOKEN_BUCKETS)
+    increment(f"{prefix}.calls")
+    if stats.retries:
+        increment(f"{prefix}.retries", stats.retries)
+    if stats.errors:
+        increment(f"{prefix}.errors", len(stats.errors))
+    report = (config or {}).get("configurable", {}).get("run_report")
+    if report is not None:
+        report.add(stats)
+
+
+def instrument(graph: str, node: str, func: Callable) -> Callable:
+    """Wrap a graph node to time it and collect its LLM usage and errors"""
+    pass_config = accepts_config(func)
+
+    def wrapper(state, config=None):
+        stats = NodeStats(graph, node)
+        token = _current_node.set(stats)
+        start = time.perf_counter()
+        try:
+            return func(state, config=config) if pass_config else func(state)
+        except Exception as e:
+            node_error(e)
+            raise
+        finally:
+            _current_node.reset(token)
+            _record(stats, config, start)
+
+    # Not functools.wraps: the graph must see this wrapper's config parameter
+    wrapper.__name__ = wrapper.__qualname__ = getattr(func, "__name__", node)
+    return wrapper
+
+
+def ainstrument(graph: str, node: str, func: Callable) -> Callable:
+    """Async counterpart of instrument"""
+    pass_config = accepts_config(func)
+
+    async def wrapper(state, config=None):
+        stats = NodeStats(graph, node)
+        token = _current_node.set(stats)
+        start = time.perf_counter()
+        try:
+            return await (func(state, config=config) if pass_config else func(state))
+        except Exception as e:
+            node_error(e)
+            raise
+        finally:
+            _current_node.reset(token)
+            _record(stats, config, start)
+
+    wrapper.__name__ = wrapper.__qualname__ = getattr(func, "__name__", node)
+    return wrapper
+
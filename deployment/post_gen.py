@@ -7,7 +7,7 @@ import pandas as pd
 from pydantic import BaseModel, Field
 
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_groq import ChatGroq
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import END, StateGraph
 
 import re
@@ -16,14 +16,8 @@ import os
 import logging
 import pyshorteners
 
-from dotenv import load_dotenv
-import os
-
-# Load .env file
-load_dotenv()
-
-# Use os.getenv() to avoid KeyError
-GROQ_API_KEY= os.getenv('GROQ_API_KEY')
+from model_registry import get_llm
+import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -36,12 +30,8 @@ logger = logging.getLogger(__name__)
 # Set random seed for reproducibility
 seed = np.random.seed(42)
 
-# Initialize the LLM (using Groq's llama3-70b-8192 model)
-llm = ChatGroq(
-    model="llama3-70b-8192",
-    temperature=0.7,
-    api_key=GROQ_API_KEY
-)
+# Shared Groq client (llama3-70b-8192 by default) from the model registry
+llm = get_llm(temperature=0.7)
 
 # Define different tone prompts
 TONE_PROMPTS = {
@@ -141,15 +131,35 @@ class Appstate(TypedDict):
     linkedin_post: Post
     n_drafts: int
 
-def editor_node(state: Appstate):
+def complete(messages, config: RunnableConfig, stage: str) -> str:
+    """Call the LLM, streaming partial text to the run's on_token(stage, text_so_far) callback if one is set"""
+    on_token = (config or {}).get("configurable", {}).get("on_token")
+    if on_token is None:
+        return llm.invoke(messages).content
+    text = ""
+    for chunk in llm.stream(messages):
+        text += chunk.content
+        on_token(stage, text)
+    return text
+
+def build_draft_info(index: int, draft: str, tone: str, sources: list) -> dict:
+    """Entry for one draft as stored in linkedinpost.json"""
+    return {
+        "draft_number": index + 1,
+        "content": textwrap.fill(draft, 80),
+        "tone": tone,
+        "sources": sources  # Include only the one shortened source if available.
+    }
+
+def editor_node(state: Appstate, config: RunnableConfig):
     """Process the input text to make it more engaging"""
     tone_instructions = TONE_PROMPTS.get(state['tone'], "")
     prompt = f"""text:{state['user_text']}""".strip()
     editor_prompt_with_tone = EDITOR_PROMPT.format(tone_instructions=tone_instructions)
-    response = llm.invoke([SystemMessage(editor_prompt_with_tone), HumanMessage(prompt)])
-    return {'edit_text': response.content}
+    content = complete([SystemMessage(editor_prompt_with_tone), HumanMessage(prompt)], config, "Editing")
+    return {'edit_text': content}
 
-def linkedin_writer_node(state: Appstate):
+def linkedin_writer_node(state: Appstate, config: RunnableConfig):
     """Generate LinkedIn post drafts"""
     post = state['linkedin_post']
     tone_instructions = TONE_PROMPTS.get(state['tone'], "")
@@ -169,11 +179,20 @@ def linkedin_writer_node(state: Appstate):
     write only the text for the post""".strip()
     
     linkedin_prompt_with_tone = LINKEDIN_PROMPT.format(tone_instructions=tone_instructions)
-    response = llm.invoke([SystemMessage(linkedin_prompt_with_tone), HumanMessage(prompt)])
-    post.drafts.append(response.content)
+    content = complete(
+        [SystemMessage(linkedin_prompt_with_tone), HumanMessage(prompt)], config,
+        f"Writing draft {len(post.drafts) + 1}"
+    )
+    post.drafts.append(content)
+
+    # Hand finished drafts to the caller right away
+    on_draft = (config or {}).get("configurable", {}).get("on_draft")
+    if on_draft is not None:
+        index = len(post.drafts) - 1
+        on_draft(build_draft_info(index, content, state['tone'], state['sources']))
     return {'linkedin_post': post}
 
-def critique_linkedin_node(state: Appstate):
+def critique_linkedin_node(state: Appstate, config: RunnableConfig):
     """Provide feedback on the LinkedIn post drafts"""
     post = state['linkedin_post']
     if post.drafts:
@@ -182,10 +201,10 @@ def critique_linkedin_node(state: Appstate):
         Target audience: {state['target_audience']}
         Requested tone: {state["tone"]}
         """.strip()
-        response = llm.invoke(
-            [SystemMessage(LINKEDIN_CRITIQUE_PROMPT), HumanMessage(prompt)]
+        post.feedback = complete(
+            [SystemMessage(LINKEDIN_CRITIQUE_PROMPT), HumanMessage(prompt)], config,
+            f"Reviewing draft {len(post.drafts)}"
         )
-        post.feedback = response.content
     else:
         post.feedback = "No draft available to critique yet."
     return {'linkedin_post': post}
@@ -244,10 +263,12 @@ def shorten_sources(sources: list) -> list:
     """Shorten each URL in the sources list."""
     return [shorten_url(url) for url in sources]
 
-def generate_linkedin_posts(target_audience: str = None, n_drafts: int = None):
+def generate_linkedin_posts(target_audience: str = None, n_drafts: int = None, on_token=None, on_draft=None):
     """Generate LinkedIn posts without starting another application.
     
-    Accepts target_audience and n_drafts as parameters.
+    Accepts target_audience and n_drafts as parameters. When given,
+    on_token(stage, text_so_far) receives streamed LLM output and
+    on_draft(draft_info) is called as soon as each draft is written.
     """
     try:
         logger.info("Starting LinkedIn post generation")
@@ -283,10 +304,11 @@ def generate_linkedin_posts(target_audience: str = None, n_drafts: int = None):
         tone = get_current_tone()
         graph = StateGraph(Appstate)
         
-        graph.add_node('editor', editor_node)
-        graph.add_node('linkedin_writer', linkedin_writer_node)
-        graph.add_node('linkedin_critique', critique_linkedin_node)
-        graph.add_node('supervisor', supervisor_node)
+        # Every node is timed and its LLM usage recorded in the run report
+        graph.add_node('editor', metrics.instrument('post_gen', 'editor', editor_node))
+        graph.add_node('linkedin_writer', metrics.instrument('post_gen', 'linkedin_writer', linkedin_writer_node))
+        graph.add_node('linkedin_critique', metrics.instrument('post_gen', 'linkedin_critique', critique_linkedin_node))
+        graph.add_node('supervisor', metrics.instrument('post_gen', 'supervisor', supervisor_node))
         
         graph.add_edge('editor', 'linkedin_writer')
         graph.add_edge('linkedin_writer', 'supervisor')
@@ -296,30 +318,28 @@ def generate_linkedin_posts(target_audience: str = None, n_drafts: int = None):
         graph.set_entry_point('editor')
         app = graph.compile()
         
-        config = {"configurable": {"thread_id": 42}}
+        report = metrics.RunReport('post_gen')
+        config = metrics.run_config(report, {"thread_id": 42, "on_token": on_token, "on_draft": on_draft})
         
         logger.info(f"Invoking LangGraph with tone: {tone}")
-        state = app.invoke(
-            {
-                "user_text": answer,
-                "target_audience": target_audience,
-                "tone": tone,
-                "sources": sources,
-                "linkedin_post": Post(drafts=[], feedback='Add Sources'),
-                "n_drafts": n_drafts,
-            },
-            config=config,
-        )
+        try:
+            state = app.invoke(
+                {
+                    "user_text": answer,
+                    "target_audience": target_audience,
+                    "tone": tone,
+                    "sources": sources,
+                    "linkedin_post": Post(drafts=[], feedback='Add Sources'),
+                    "n_drafts": n_drafts,
+                },
+                config=config,
+            )
+        finally:
+            report.finish()
         
         linkedin_output_data = []
         for i, draft in enumerate(state["linkedin_post"].drafts):
-            draft_info = {
-                "draft_number": i + 1,
-                "content": textwrap.fill(draft, 80),
-                "tone": tone,
-                "sources": sources  # Include only the one shortened source if available.
-            }
-            linkedin_output_data.append(draft_info)
+            linkedin_output_data.append(build_draft_info(i, draft, tone, sources))
         
         with open('./linkedin_posts/linkedinpost.json', 'w', encoding='utf-8') as json_file:
             json.dump(linkedin_output_data, json_file, indent=4)
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from typing import Any, Optional
+import hashlib
+import logging
+import threading
+import time
+
+from storage import read_json, write_json
+
+logger = logging.getLogger(__name__)
+
+
+def hash_key(*parts: str) -> str:
+    """Stable cache key from several string parts"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class PersistentLRUCache:
+    """Small JSON-serialisable LRU cache kept in memory and mirrored to a file.
+
+    Entries older than ``ttl`` seconds (when set) are treated as missing.
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> {"value": ..., "created": ...}
+        self.entries.update(read_json(self.path, {}))
+
+    def _expired(self, entry: dict) -> bool:
+        return self.ttl is not None and time.time() - entry["created"] > self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry["value"]
+
+    def put(self, key: str, value: Any):
+        with self.lock:
+            self.entries[key] = {"value": value, "created": time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._save()
+
+    def _save(self):
+        try:
+            write_json(self.path, self.entries)
+        except OSError as e:
+            # The in-memory cache still works without the disk copy
+            logger.warning(f"Could not write cache {self.path}: {str(e)}")
@@ -0,0 +1,67 @@
+from typing import Any, Dict, Iterator, Tuple
+import hashlib
+import json
+import os
+
+
+def source_id(source: str) -> str:
+    """Stable file-system friendly id for a document source"""
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()[:16]
+
+
+def read_json(path: str, default: Any = None) -> Any:
+    """Parsed JSON file, or ``default`` when it is missing or unreadable"""
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def write_json(path: str, data: Any, indent: int = None):
+    """Write JSON through a temporary file and ``os.replace``, so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=indent)
+    os.replace(tmp_path, path)
+
+
+class SegmentManifest:
+    """``sources.json`` of an index stored as numbered segments per source.
+
+    Each source maps to its file-system id, the fingerprint of the content
+    version that was fully indexed (None until then), the number of segment
+    parts written, and any extra counters the index keeps. Loaded on first
+    use; callers hold their own lock.
+    """
+
+    def __init__(self, path: str, **extra: Any):
+        self.path = path
+        self.extra = extra
+        self.entries = None  # source -> {"id": ..., "fingerprint": ..., "parts": ..., **extra}
+
+    def load(self) -> Dict[str, dict]:
+        if self.entries is None:
+            self.entries = read_json(self.path, {})
+        return self.entries
+
+    def save(self):
+        write_json(self.path, self.load(), indent=4)
+
+    def fingerprints(self) -> Dict[str, str]:
+        return {source: entry["fingerprint"] for source, entry in self.load().items()}
+
+    def entry(self, source: str) -> dict:
+        """Entry of a source, created empty when missing"""
+        return self.load().setdefault(source, {"id": source_id(source), "fingerprint": None, "parts": 0, **self.extra})
+
+    def pop(self, source: str) -> dict:
+        """Remove a source and return its entry, or None if it was not indexed"""
+        return self.load().pop(source, None)
+
+    def parts(self) -> Iterator[Tuple[str, str, int]]:
+        """(source, segment id, part) of every stored segment, in order"""
+        for source, entry in self.load().items():
+            for part in range(entry["parts"]):
+                yield source, entry["id"], part
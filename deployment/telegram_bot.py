@@ -2,16 +2,19 @@ import os
 import json
 import logging
 import asyncio
+import time
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
 )
 
 from knowledge_base import run_data_collection
-from knowledge_retrieve import run_rag
+from knowledge_retrieve import arun_rag
 from post_gen import generate_linkedin_posts  # Updated to accept parameters (see below)
 from tone_config import set_tone, get_current_tone, list_available_tones
 from linkedin import get_user_info, post_to_linkedin  # New LinkedIn module import
+from model_registry import warm_up
 
 from dotenv import load_dotenv
 import os
@@ -21,6 +24,12 @@ load_dotenv()
 
 # Use os.getenv() to avoid KeyError
 BOT_TOKEN = os.getenv('BOT_TOKEN')
+# Load the embedding model and LLM clients at startup instead of on the first /new
+WARM_UP_MODELS = os.getenv('WARM_UP_MODELS', 'true').lower() in ('1', 'true', 'yes')
+# Minimum seconds between edits of a progress message; Telegram rate-limits edits per chat
+TELEGRAM_EDIT_INTERVAL = float(os.getenv('TELEGRAM_EDIT_INTERVAL', '1.5'))
+# Streamed previews show only the tail of the text, well inside Telegram's 4096-character limit
+TELEGRAM_PREVIEW_CHARS = int(os.getenv('TELEGRAM_PREVIEW_CHARS', '3500'))
 
 # Configure logging
 logging.basicConfig(
@@ -36,6 +45,81 @@ USER_STATES = {}
 # LinkedIn token storage
 LINKEDIN_TOKENS = {}
 
+class ThrottledEditor:
+    """Keeps one message showing the latest text, editing it at most once per interval.
+
+    update() may be called for every streamed token; intermediate texts are
+    dropped and only the newest one is sent when the interval allows.
+    """
+
+    def __init__(self, message, interval: float = TELEGRAM_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self.pending = None
+        self.shown = None
+        self.last_edit = 0.0
+        self.task = None
+
+    def update(self, text: str) -> None:
+        """Schedule text to be shown; must be called from the event loop"""
+        self.pending = text
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._flush())
+
+    async def set(self, text: str) -> None:
+        """Show text now, discarding any pending partial update"""
+        await self.close()
+        await self._edit(text)
+
+    async def close(self) -> None:
+        """Drop pending updates so a later edit is not overwritten by stale text"""
+        self.pending = None
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    async def _flush(self):
+        while self.pending is not None:
+            delay = self.last_edit + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text, self.pending = self.pending, None
+            if text is not None and text != self.shown:
+                await self._edit(text)
+
+    async def _edit(self, text: str):
+        self.last_edit = time.monotonic()
+        try:
+            await self.message.edit_text(text)
+            self.shown = text
+        except BadRequest as e:
+            # Editing to identical text is rejected; anything else is only a lost preview
+            if "not modified" not in str(e).lower():
+                logger.warning(f"Could not update progress message: {str(e)}")
+        except Exception as e:
+            logger.warning(f"Could not update progress message: {str(e)}")
+
+def preview(header: str, text: str) -> str:
+    """Progress header followed by the tail of the streamed text"""
+    if len(text) > TELEGRAM_PREVIEW_CHARS:
+        text = "…" + text[-TELEGRAM_PREVIEW_CHARS:]
+    return f"{header}\n\n{text}"
+
+def format_post(i: int, post: dict) -> str:
+    """Telegram text for one generated draft"""
+    clean_content = post['content']
+    # Remove unwanted AI jargon if present
+    unwanted_prefix = 'Here is a rewritten LinkedIn post based on the provided text and feedback:', 'Here is a rewritten LinkedIn post:', 'Here is a compelling LinkedIn post:', 'Here is a rewritten LinkedIn post:','Here is a rewritten version of the text optimized for LinkedIn engagement:'
+    if clean_content.startswith(unwanted_prefix):
+        clean_content = clean_content[len(unwanted_prefix):].strip()
+    clean_content = clean_content.replace("*", "\*").replace("_", "\_").replace("`", "\`").replace("[", "\[")
+    # Removed the sources section
+    return f"Post {i+1} (Tone: {post['tone'].capitalize()})\n\n{clean_content}"
+
 # State definitions
 class State:
     IDLE = 0
@@ -69,7 +153,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "*How to use:*\n"
         "1. Type /new to start\n"
         "2. Enter your instructions (what you want posts about)\n"
-        "3. Provide your content (URL, GitHub repo, or topic)\n"
+        "3. Provide your content (URL, GitHub repo, or topic; several URLs one per line)\n"
         "4. Then, you'll be asked for the target audience and number of drafts\n"
         "5. Wait for the bot to generate posts\n"
         "6. Use /upload_linkedin to post a draft to LinkedIn"
@@ -239,7 +323,8 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             "Great! Now please provide your content. This can be:\n"
             "- A URL (e.g., https://example.com/article)\n"
             "- A GitHub repository URL (e.g., https://github.com/username/repo)\n"
-            "- A topic (e.g., Artificial Intelligence)"
+            "- A topic (e.g., Artificial Intelligence)\n"
+            "- Several URLs or repositories, one per line, to combine them"
         )
     elif state == State.WAITING_FOR_CONTENT:
         # Store the content and then ask for target audience
@@ -297,33 +382,58 @@ async def process_content(update: Update, context: ContextTypes.DEFAULT_TYPE, in
     """Process user instructions and content to generate posts."""
     try:
         message = await update.message.reply_text("Step 1/3: Collecting data... 📊")
+        editor = ThrottledEditor(message)
         # Use the async version of run_data_collection
         from knowledge_base import run_data_collection_async
-        await run_data_collection_async(instructions, content)
-        await message.edit_text("Step 2/3: Analyzing and retrieving information... 🔍")
-        # If run_rag is synchronous and potentially blocking, consider creating an async version
-        # or running it in a ThreadPoolExecutor
-        await asyncio.to_thread(run_rag)  # This runs the synchronous function in a separate thread
-        await message.edit_text("Step 3/3: Generating posts... ✍️")
-        # Same for generate_linkedin_posts if it's synchronous
+        # Every source in the message is fetched concurrently into one corpus
+        logger.info(await run_data_collection_async(instructions, content))
+        step_2 = "Step 2/3: Analyzing and retrieving information... 🔍"
+        await editor.set(step_2)
+        # Native async RAG: Groq calls are awaited on the event loop and only
+        # indexing/embedding use the pipeline's small CPU thread pool.
+        # The answer is shown in the progress message while it is generated.
+        await arun_rag(on_token=lambda stage, text: editor.update(preview(step_2, text)))
+        step_3 = "Step 3/3: Generating posts... ✍️"
+        await editor.set(step_3)
+
+        # generate_linkedin_posts runs in a worker thread, so its callbacks hop
+        # back onto the event loop. Each draft is sent as soon as it is written.
+        loop = asyncio.get_running_loop()
+        sent = set()
+        send_lock = asyncio.Lock()
+        sends = []
+
+        async def send_post(i, post):
+            async with send_lock:
+                if i in sent:
+                    return
+                await update.message.reply_text(format_post(i, post))
+                sent.add(i)
+
+        def on_token(stage, text):
+            loop.call_soon_threadsafe(editor.update, preview(f"{step_3}\n{stage}:", text))
+
+        def on_draft(post):
+            sends.append(asyncio.run_coroutine_threadsafe(send_post(post["draft_number"] - 1, post), loop))
+
         await asyncio.to_thread(
             generate_linkedin_posts,
             target_audience=context.user_data.get("target_audience", "AI/ML engineers and researchers, Data Scientists"),
-            n_drafts=context.user_data.get("n_drafts", 3)
+            n_drafts=context.user_data.get("n_drafts", 3),
+            on_token=on_token,
+            on_draft=on_draft
         )
+        for future in sends:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception as e:
+                logger.warning(f"Could not send draft early: {str(e)}")
         with open('./linkedin_posts/linkedinpost.json', 'r', encoding='utf-8') as f:
             posts = json.load(f)
-        await message.edit_text("✅ Posts generated successfully!")
+        await editor.set("✅ Posts generated successfully!")
+        # Drafts that were not streamed (e.g. a failed send) are sent now
         for i, post in enumerate(posts):
-            clean_content = post['content']
-            # Remove unwanted AI jargon if present
-            unwanted_prefix = 'Here is a rewritten LinkedIn post based on the provided text and feedback:', 'Here is a rewritten LinkedIn post:', 'Here is a compelling LinkedIn post:', 'Here is a rewritten LinkedIn post:','Here is a rewritten version of the text optimized for LinkedIn engagement:'
-            if clean_content.startswith(unwanted_prefix):
-                clean_content = clean_content[len(unwanted_prefix):].strip()
-            clean_content = clean_content.replace("*", "\*").replace("_", "\_").replace("`", "\`").replace("[", "\[")
-            post_text = f"Post {i+1} (Tone: {post['tone'].capitalize()})\n\n{clean_content}"
-            # Removed the sources section
-            await update.message.reply_text(post_text)
+            await send_post(i, post)
         await update.message.reply_text(
             "What would you like to do next?\n"
             "- Ask me questions about these posts\n"
@@ -343,6 +453,13 @@ def main():
     os.makedirs('./query', exist_ok=True)
     os.makedirs('./config', exist_ok=True)
     os.makedirs('./linkedin_posts', exist_ok=True)
+
+    if WARM_UP_MODELS:
+        try:
+            warm_up()
+        except Exception as e:
+            # The registry loads lazily, so a failed warm-up only costs the first request
+            logger.error(f"Model warm-up failed: {str(e)}")
     
     application = Application.builder().token(BOT_TOKEN).build()
     
@@ -0,0 +1,134 @@
+from typing import Optional, Tuple
+import numpy as np
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Return a float32 copy of the matrix with unit-length rows"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def normalize_query(embedding) -> np.ndarray:
+    query = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    return query / norm if norm else query
+
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row indices and cosine scores of the k best rows, best first.
+
+    One matrix-vector product scores every row; argpartition finds the k
+    largest in linear time and only those k are sorted.
+    """
+    n = matrix.shape[0]
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    scores = matrix @ query
+    if k < n:
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    # Sort by score, breaking ties by row order like a stable full sort would
+    order = np.lexsort((candidates, -scores[candidates]))
+    best = candidates[order]
+    return best, scores[best]
+
+
+def mmr(vectors: np.ndarray, query: np.ndarray, k: int, lambda_mult: float = 0.5,
+        relevance: Optional[np.ndarray] = None) -> np.ndarray:
+    """Indices of k rows picked by maximal marginal relevance, in selection order.
+
+    Each step takes the row maximizing
+    ``lambda_mult * relevance - (1 - lambda_mult) * max similarity to the rows already picked``.
+    ``vectors`` must have unit rows; ``relevance`` defaults to their cosine
+    similarity to ``query``. All pairwise similarities come from one matrix
+    product, and each step only updates a running maximum with NumPy.
+    """
+    n = vectors.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if relevance is None:
+        relevance = vectors @ query
+    similarity = vectors @ vectors.T
+    redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected = np.empty(k, dtype=np.int64)
+    for step in range(k):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        pick = int(np.argmax(scores))
+        selected[step] = pick
+        available[pick] = False
+        redundancy = similarity[:, pick] if step == 0 else np.maximum(redundancy, similarity[:, pick])
+    return selected
+
+
+class QuantizedMatrix:
+    """Compact copy of a matrix with unit rows: float16 values, or int8 codes with one scale per row.
+
+    Indexing returns float32 rows and ``matrix @ x`` is computed in blocks,
+    so it can stand in for a float32 array in top_k and the ANN index while
+    never holding more than ``block_rows`` dequantized rows at a time.
+    """
+
+    def __init__(self, codes: np.ndarray, scales: Optional[np.ndarray] = None, block_rows: int = 8192):
+        self.codes = codes
+        self.scales = scales
+        self.block_rows = block_rows
+
+    @classmethod
+    def quantize(cls, matrix: np.ndarray, precision: str, rows: Optional[np.ndarray] = None,
+                 block_rows: int = 8192) -> "QuantizedMatrix":
+        """Quantize ``matrix`` (or only ``rows`` of it) block by block; ``matrix`` may be a memmap"""
+        n = matrix.shape[0] if rows is None else len(rows)
+        dim = matrix.shape[1] if matrix.ndim == 2 else 0
+        codes = np.empty((n, dim), dtype=np.int8 if precision == "int8" else np.float16)
+        scales = np.empty(n, dtype=np.float32) if precision == "int8" else None
+        for start in range(0, n, block_rows):
+            stop = min(n, start + block_rows)
+            block = np.asarray(matrix[start:stop] if rows is None else matrix[rows[start:stop]], dtype=np.float32)
+            if scales is None:
+                codes[start:stop] = block
+            else:
+                scale = np.abs(block).max(axis=1) / 127
+                scale[scale == 0] = 1
+                codes[start:stop] = np.round(block / scale[:, None])
+                scales[start:stop] = scale
+        return cls(codes, scales, block_rows)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def size(self) -> int:
+        return self.codes.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self):
+        return self.codes.shape[0]
+
+    def __getitem__(self, index) -> np.ndarray:
+        block = self.codes[index].astype(np.float32)
+        if self.scales is not None:
+            block *= self.scales[index][..., None]
+        return block
+
+    def __matmul__(self, other: np.ndarray) -> np.ndarray:
+        n = self.codes.shape[0]
+        if n <= self.block_rows:
+            return self[:] @ other
+        return np.concatenate([self[start:start + self.block_rows] @ other for start in range(0, n, self.block_rows)])
+
+    def take(self, rows: np.ndarray) -> "QuantizedMatrix":
+        """Quantized copy of the given rows, without dequantizing"""
+        return QuantizedMatrix(self.codes[rows], self.scales[rows] if self.scales is not None else None, self.block_rows)
+
+
+def take_rows(matrix, rows: np.ndarray):
+    """Contiguous copy of the given rows, staying quantized for a QuantizedMatrix"""
+    return matrix.take(rows) if isinstance(matrix, QuantizedMatrix) else np.ascontiguousarray(matrix[rows])
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from chunking import CHUNK_SIZE, get_text_splitter, iter_file_chunks, scan_text_file, section_for
+
+WORDS = "retrieval index vector query latency memory naïve café embedding 検索 chunk overlap".split()
+
+
+def make_text(seed, chars):
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < chars:
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 30))) + "." for _ in range(rng.randint(1, 8))]
+        # Some paragraphs are one long line so the splitter has to fall back to spaces
+        paragraph = (" " if rng.random() < 0.3 else "\n").join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("block_chars", [4 * CHUNK_SIZE, 4 * CHUNK_SIZE + 777, 65536])
+def test_streamed_chunks_match_plain_split(tmp_path, seed, block_chars):
+    text = make_text(seed, 50_000)
+    path = tmp_path / "doc.txt"
+    path.write_text(text, encoding="utf-8")
+    fingerprint, total_chars = scan_text_file(str(path))
+    assert total_chars == len(text)
+
+    chunks = list(iter_file_chunks(str(path), total_chars, block_chars=block_chars))
+    plain = get_text_splitter().create_documents([text])
+
+    assert [(doc.metadata["start_index"], doc.page_content) for doc in chunks] == \
+           [(doc.metadata["start_index"], doc.page_content) for doc in plain]
+    for i, doc in enumerate(chunks):
+        start = doc.metadata["start_index"]
+        assert text[start:start + len(doc.page_content)] == doc.page_content
+        assert doc.metadata["section"] == section_for(start, total_chars)
+        assert doc.metadata["chunk_id"].endswith(f":{i}")
+
+
+def test_file_smaller_than_a_block(tmp_path):
+    path = tmp_path / "small.txt"
+    path.write_text("one short line", encoding="utf-8")
+    chunks = list(iter_file_chunks(str(path), 14))
+    assert [(doc.metadata["start_index"], doc.page_content) for doc in chunks] == [(0, "one short line")]
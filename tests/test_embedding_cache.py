@@ -0,0 +1,56 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+DIM = 2048  # 1 MB holds 128 vectors
+
+
+def vector(i):
+    return np.full(DIM, i, dtype=np.float32)
+
+
+def check_entries(cache):
+    for key, (row, _) in cache.entries.items():
+        np.testing.assert_array_equal(cache.matrix[row], vector(int(key)))
+
+
+def test_eviction_keeps_size_cap(tmp_path):
+    cache = EmbeddingCache("model", str(tmp_path), max_mb=1)
+    for start in range(0, 400, 50):
+        keys = [str(i) for i in range(start, start + 50)]
+        cache.put_many(keys, [vector(i) for i in range(start, start + 50)])
+    assert cache.capacity == 128
+    assert len(cache.entries) <= cache.capacity
+    # The newest batch survives eviction; the oldest is gone
+    assert all(value is not None for value in cache.get_many([str(i) for i in range(350, 400)]))
+    assert cache.get_many(["0"]) == [None]
+    check_entries(cache)
+
+
+def test_reload_after_flush_round_trips(tmp_path):
+    cache = EmbeddingCache("model", str(tmp_path), max_mb=1)
+    for start in range(0, 300, 50):
+        cache.put_many([str(i) for i in range(start, start + 50)], [vector(i) for i in range(start, start + 50)])
+    cache.flush()
+
+    reloaded = EmbeddingCache("model", str(tmp_path), max_mb=1)
+    assert reloaded.entries == cache.entries
+    assert len(reloaded.free_rows) == cache.capacity - len(cache.entries)
+    check_entries(reloaded)
+
+
+def test_reload_without_flush_never_serves_reused_rows(tmp_path):
+    cache = EmbeddingCache("model", str(tmp_path), max_mb=1)
+    for start in range(0, 300, 50):
+        cache.put_many([str(i) for i in range(start, start + 50)], [vector(i) for i in range(start, start + 50)])
+    # No flush: a crash here leaves the index written by the last eviction
+    reloaded = EmbeddingCache("model", str(tmp_path), max_mb=1)
+    assert reloaded.entries
+    check_entries(reloaded)
+
+
+def test_size_limit_change_starts_fresh(tmp_path):
+    cache = EmbeddingCache("model", str(tmp_path), max_mb=1)
+    cache.put_many(["1"], [vector(1)])
+    cache.flush()
+    assert EmbeddingCache("model", str(tmp_path), max_mb=2).entries == {}
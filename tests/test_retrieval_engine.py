@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+import ann_index
+from retrieval_engine import SectionedSearchEngine
+from vector_math import normalize_rows
+
+SECTIONS = ("beginning", "middle", "end")
+K = 4
+
+
+def corpus(n=6000, dim=64, clusters=60, seed=0):
+    """Clustered unit vectors, like embeddings of chunks about a few topics"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim))
+    matrix = centers[rng.integers(0, clusters, size=n)] + 0.35 * rng.standard_normal((n, dim))
+    documents = [Document(page_content=str(i), metadata={"section": SECTIONS[i % 3], "source": f"s{i % 7}", "type": "url"})
+                 for i in range(n)]
+    queries = matrix[rng.integers(0, n, size=100)] + 0.2 * rng.standard_normal((100, dim))
+    return matrix.astype(np.float32), documents, queries.astype(np.float32)
+
+
+def brute_force(matrix, query, k, rows=None):
+    rows = np.arange(len(matrix)) if rows is None else rows
+    scores = normalize_rows(matrix[rows]) @ (query / np.linalg.norm(query))
+    return set(rows[np.argsort(-scores)[:k]].tolist())
+
+
+def found(results):
+    return {int(doc.page_content) for doc, _ in results}
+
+
+def recall(engine, matrix, queries, filter_for):
+    hits = 0
+    for i, query in enumerate(queries):
+        filter = filter_for(i)
+        rows = None
+        if filter:
+            rows = np.flatnonzero([doc.metadata[key] == value for doc in engine.documents for key, value in filter.items()])
+        hits += len(found(engine.search(query, k=K, filter=filter)) & brute_force(matrix, query, K, rows))
+    return hits / (len(queries) * K)
+
+
+UNFILTERED = lambda i: None
+BY_SECTION = lambda i: {"section": SECTIONS[i % 3]}
+BY_SOURCE = lambda i: {"source": f"s{i % 7}"}
+
+
+@pytest.mark.parametrize("filter_for", [UNFILTERED, BY_SECTION, BY_SOURCE])
+def test_exact_search_matches_brute_force(filter_for):
+    matrix, documents, queries = corpus()
+    engine = SectionedSearchEngine(matrix, documents)
+    assert recall(engine, matrix, queries, filter_for) == 1.0
+
+
+@pytest.mark.parametrize("filter_for", [UNFILTERED, BY_SECTION])
+def test_ann_recall_against_brute_force(monkeypatch, filter_for):
+    monkeypatch.setattr(ann_index, "ANN_MIN_SIZE", 1000)
+    matrix, documents, queries = corpus()
+    engine = SectionedSearchEngine(matrix, documents)
+    assert all(ann is not None for _, _, ann in engine.partitions.values())
+    assert recall(engine, matrix, queries, filter_for) >= ann_index.ANN_TARGET_RECALL - 0.05
+    # exact=True bypasses the IVF index
+    for query in queries[:10]:
+        assert found(engine.search(query, k=K, exact=True)) == brute_force(matrix, query, K)
+
+
+@pytest.mark.parametrize("precision", ["float16", "int8"])
+@pytest.mark.parametrize("filter_for", [UNFILTERED, BY_SECTION])
+def test_quantized_recall_against_brute_force(tmp_path, precision, filter_for):
+    matrix, documents, queries = corpus()
+    # As in LocalVectorIndex, the full-precision vectors for rescoring stay on disk
+    full_precision = np.memmap(tmp_path / "full_precision.f32", dtype=np.float32, mode='w+', shape=matrix.shape)
+    full_precision[:] = normalize_rows(matrix)
+    engine = SectionedSearchEngine(full_precision, documents, precision=precision, normalized=True)
+    assert recall(engine, matrix, queries, filter_for) >= 0.98
+    assert engine.stats["vector_mb"] < engine.stats["float32_mb"]
+
+
+def test_empty_engine():
+    engine = SectionedSearchEngine(np.zeros((0, 8), dtype=np.float32), [])
+    assert engine.search(np.ones(8, dtype=np.float32), k=K) == []